@@ -0,0 +1 @@
+"""Helpers shared by the MCP demo and test clients."""
@@ -0,0 +1,362 @@
+import asyncio
+import hashlib
+import importlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp import ClientSession, StdioServerParameters, types
+from mcp.client.stdio import stdio_client
+from mcp.server import Server
+from mcp.server.fastmcp import FastMCP
+from mcp.types import Tool as MCPTool
+
+logger = logging.getLogger(__name__)
+
+# Tool schemas from earlier runs, so the agent can be built without starting servers
+TOOL_CACHE_PATH = Path(
+    os.getenv(
+        "MCP_TOOL_CACHE_PATH", str(Path.home() / ".cache" / "mcp" / "tool_schemas.json")
+    )
+)
+# Servers unused for this many seconds are shut down (0 keeps them running)
+SERVER_IDLE_SECONDS = float(os.getenv("MCP_SERVER_IDLE_SECONDS", "300"))
+# Mount servers that declare an "in_process" target in the client's event loop;
+# set to 0 to run every server as a separate stdio process for isolation
+IN_PROCESS_SERVERS = os.getenv("MCP_IN_PROCESS_SERVERS", "1") == "1"
+
+
+def server_cache_key(params: dict[str, Any]) -> tuple[str, str]:
+    """
+    Identify a server by its command and resolved arguments, and its version
+    by the modification times of any script files among them. A new version
+    invalidates the cached tool schemas.
+    """
+    cwd = Path(params.get("cwd") or ".")
+    identity = [params.get("command", "")]
+    mtimes = []
+    for arg in params.get("args", []):
+        path = cwd / arg
+        if path.is_file():
+            identity.append(str(path.resolve()))
+            mtimes.append(str(path.stat().st_mtime_ns))
+        else:
+            identity.append(arg)
+    key = hashlib.sha256("\0".join(identity).encode()).hexdigest()
+    return key, ",".join(mtimes)
+
+
+def load_server(target: str) -> Union[Server, FastMCP]:
+    """
+    Resolve a "module:attribute" target to an MCP server. The attribute may
+    be a Server, a FastMCP instance, an object with an ``mcp`` FastMCP
+    attribute, or a callable returning one of those.
+    """
+    module_name, _, attribute = target.partition(":")
+    server = getattr(importlib.import_module(module_name), attribute)
+    if callable(server) and not isinstance(server, (Server, FastMCP)):
+        server = server()
+    if isinstance(getattr(server, "mcp", None), FastMCP):
+        server = server.mcp
+    if not isinstance(server, (Server, FastMCP)):
+        raise TypeError(f"{target} is not an MCP server")
+    return server
+
+
+class InProcessSession:
+    """
+    Calls a server's tools directly in the client's event loop. Tool schemas,
+    results and error reporting are the server's own; only the JSON-RPC
+    transport is skipped.
+
+    FastMCP tools are called through ``FastMCP.call_tool``, which validates
+    arguments with the tool's pydantic model. Low-level servers go through
+    their registered request handlers, including the SDK's per-call JSON
+    Schema check of the arguments.
+    """
+
+    def __init__(self, server: Union[Server, FastMCP]):
+        self.server = server
+
+    async def list_tools(self) -> types.ListToolsResult:
+        if isinstance(self.server, FastMCP):
+            return types.ListToolsResult(tools=await self.server.list_tools())
+        handler = self.server.request_handlers[types.ListToolsRequest]
+        return (await handler(types.ListToolsRequest(method="tools/list"))).root
+
+    async def call_tool(
+        self, name: str, arguments: Optional[dict[str, Any]] = None
+    ) -> types.CallToolResult:
+        if isinstance(self.server, FastMCP):
+            return await self._call_fastmcp_tool(name, arguments or {})
+        handler = self.server.request_handlers[types.CallToolRequest]
+        request = types.CallToolRequest(
+            method="tools/call",
+            params=types.CallToolRequestParams(name=name, arguments=arguments or {}),
+        )
+        return (await handler(request)).root
+
+    async def _call_fastmcp_tool(
+        self, name: str, arguments: dict[str, Any]
+    ) -> types.CallToolResult:
+        try:
+            result = await self.server.call_tool(name, arguments)
+        except Exception as e:
+            # Reported the same way the server reports tool errors over stdio
+            return types.CallToolResult(
+                content=[types.TextContent(type="text", text=str(e))], isError=True
+            )
+        structured = None
+        if isinstance(result, tuple):
+            result, structured = result
+        elif isinstance(result, dict):
+            structured = result
+            result = [types.TextContent(type="text", text=json.dumps(result, indent=2))]
+        return types.CallToolResult(content=list(result), structuredContent=structured)
+
+    async def send_ping(self) -> types.EmptyResult:
+        return types.EmptyResult()
+
+
+class _LazySession:
+    """Stands in for a ClientSession; the server is started on the first tool call."""
+
+    def __init__(self, registry: "LazyServerRegistry", server_name: str):
+        self.registry = registry
+        self.server_name = server_name
+
+    async def call_tool(self, name: str, arguments: Optional[dict[str, Any]] = None):
+        return await self.registry.call_tool(self.server_name, name, arguments)
+
+
+class _ServerHandle:
+    def __init__(self):
+        self.session: Optional[ClientSession] = None
+        self.owner: Optional[asyncio.Task] = None
+        self.stop: Optional[asyncio.Event] = None
+        self.lock = asyncio.Lock()
+        self.last_used = 0.0
+        self.active_calls = 0
+
+    @property
+    def running(self) -> bool:
+        # In-process servers have a session but no owner task
+        return self.session is not None and (self.owner is None or not self.owner.done())
+
+
+class LazyServerRegistry:
+    """
+    Starts stdio MCP servers on demand instead of all at once.
+
+    Takes the same connection dict as ``MultiServerMCPClient``. ``get_tools``
+    answers from the on-disk schema cache where it can, starting only servers
+    missing from it. Each server process is started by the first call to one
+    of its tools and stopped again after ``idle_seconds`` without calls.
+
+    A connection may also name an ``"in_process"`` target (see
+    ``load_server``); with ``in_process`` enabled that server is imported and
+    called directly instead of being spawned. All methods must be awaited on
+    the same event loop.
+    """
+
+    def __init__(
+        self,
+        connections: dict[str, dict[str, Any]],
+        cache_path: Path = TOOL_CACHE_PATH,
+        idle_seconds: float = SERVER_IDLE_SECONDS,
+        in_process: bool = IN_PROCESS_SERVERS,
+    ):
+        for name, params in connections.items():
+            if params.get("transport", "stdio") != "stdio":
+                raise ValueError(f"Server {name}: only stdio servers can be started lazily")
+        self.connections = connections
+        self.cache_path = Path(cache_path)
+        self.idle_seconds = idle_seconds
+        self.in_process = in_process
+        self.servers = {name: _ServerHandle() for name in connections}
+        self._reaper: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "LazyServerRegistry":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _load_cache(self) -> dict[str, Any]:
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_cache(self, cache: dict[str, Any]):
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(cache, f, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write MCP tool schema cache: {e}")
+
+    async def get_tools(self) -> list[BaseTool]:
+        """LangChain tools for every server, starting only servers with no cached schemas."""
+        cache = self._load_cache()
+        keys = {
+            name: server_cache_key(params)
+            for name, params in self.connections.items()
+            if not self._mounted(name)
+        }
+        missing = [
+            name
+            for name, (key, version) in keys.items()
+            if cache.get(key, {}).get("version") != version
+        ]
+        if missing:
+            logger.info(f"Loading tool schemas from servers: {', '.join(missing)}")
+            listed = await asyncio.gather(*(self._list_tools(name) for name in missing))
+            for name, tools in zip(missing, listed):
+                key, version = keys[name]
+                cache[key] = {
+                    "server": name,
+                    "version": version,
+                    "tools": [tool.model_dump(mode="json", exclude_none=True) for tool in tools],
+                }
+            self._save_cache(cache)
+
+        tools = []
+        for name in self.connections:
+            if self._mounted(name):
+                # Listing an in-process server only costs the module import
+                schemas = await self._list_tools(name)
+            else:
+                schemas = [MCPTool.model_validate(t) for t in cache[keys[name][0]]["tools"]]
+            session = _LazySession(self, name)
+            tools.extend(convert_mcp_tool_to_langchain_tool(session, t) for t in schemas)
+        return tools
+
+    def _mounted(self, server_name: str) -> bool:
+        return self.in_process and "in_process" in self.connections[server_name]
+
+    async def _list_tools(self, server_name: str) -> list[MCPTool]:
+        session = await self._ensure_started(server_name)
+        return (await session.list_tools()).tools
+
+    async def _own_server(self, server_name: str, ready: asyncio.Future, stop: asyncio.Event):
+        # The stdio transport must be entered and exited from the same task
+        params = self.connections[server_name]
+        env = dict(params.get("env") or {})
+        env.setdefault("PATH", os.environ.get("PATH", ""))
+        server_params = StdioServerParameters(
+            command=params["command"],
+            args=params["args"],
+            env=env,
+            cwd=params.get("cwd"),
+        )
+        try:
+            async with stdio_client(server_params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    ready.set_result(session)
+                    await stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.error(f"MCP server {server_name} exited with error: {e}")
+
+    async def _ensure_started(self, server_name: str) -> ClientSession:
+        handle = self.servers[server_name]
+        handle.last_used = time.monotonic()
+        if handle.running:
+            return handle.session
+        if self._mounted(server_name):
+            handle.session = InProcessSession(
+                load_server(self.connections[server_name]["in_process"])
+            )
+            return handle.session
+        async with handle.lock:
+            if not handle.running:
+                started = time.perf_counter()
+                ready = asyncio.get_running_loop().create_future()
+                handle.stop = asyncio.Event()
+                handle.owner = asyncio.create_task(
+                    self._own_server(server_name, ready, handle.stop)
+                )
+                handle.session = await ready
+                logger.info(
+                    f"Started MCP server {server_name} in {time.perf_counter() - started:.2f}s"
+                )
+                self._start_reaper()
+        return handle.session
+
+    async def call_tool(
+        self, server_name: str, name: str, arguments: Optional[dict[str, Any]] = None
+    ):
+        handle = self.servers[server_name]
+        session = await self._ensure_started(server_name)
+        handle.active_calls += 1
+        try:
+            return await session.call_tool(name, arguments)
+        except Exception:
+            # A broken transport means the process is gone; start a new one next time
+            if not await self._ping(server_name):
+                await self.stop_server(server_name)
+            raise
+        finally:
+            handle.active_calls -= 1
+            handle.last_used = time.monotonic()
+
+    async def _ping(self, server_name: str, timeout: float = 5.0) -> bool:
+        try:
+            await asyncio.wait_for(self.servers[server_name].session.send_ping(), timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"MCP server {server_name} did not answer ping: {e!r}")
+            return False
+
+    async def check_health(self, timeout: float = 5.0) -> dict[str, bool]:
+        """Ping the running servers and stop any that do not answer, so they are respawned on next use."""
+        running = [name for name, handle in self.servers.items() if handle.running]
+        results = await asyncio.gather(*(self._ping(name, timeout) for name in running))
+        for name, healthy in zip(running, results):
+            if not healthy:
+                await self.stop_server(name)
+        return dict(zip(running, results))
+
+    async def stop_server(self, server_name: str):
+        handle = self.servers[server_name]
+        if handle.owner is not None:
+            handle.stop.set()
+            await handle.owner
+            logger.info(f"Stopped MCP server {server_name}")
+        handle.session = handle.owner = handle.stop = None
+
+    def _start_reaper(self):
+        if self.idle_seconds > 0 and (self._reaper is None or self._reaper.done()):
+            self._reaper = asyncio.create_task(self._reap_idle_servers())
+
+    async def _reap_idle_servers(self):
+        while any(h.owner is not None and h.running for h in self.servers.values()):
+            await asyncio.sleep(max(self.idle_seconds / 4, 1.0))
+            now = time.monotonic()
+            for name, handle in self.servers.items():
+                if (
+                    handle.owner is not None
+                    and handle.running
+                    and handle.active_calls == 0
+                    and now - handle.last_used > self.idle_seconds
+                ):
+                    logger.info(f"Stopping idle MCP server {name}")
+                    await self.stop_server(name)
+
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        await asyncio.gather(*(self.stop_server(name) for name in self.servers))
@@ -1,5 +1,6 @@
 #/bin/bash
 export DOCKER_CLI_DEBUG=1
-sudo docker build -t travel-assist:latest .
+# The build context is the MCP directory, which also holds the shared common package
+sudo docker build -t travel-assist:latest -f Dockerfile ..
 sudo docker tag travel-assist:latest ger-is-registry.caas.intel.com/msoa-irl-registry/travel-assist:latest
 docker push ger-is-registry.caas.intel.com/msoa-irl-registry/travel-assist:latest
@@ -1,10 +1,63 @@
 # calculator_server.py
+import ast
 import logging
+import math
+import operator
+from typing import Optional, Union
 
+import numpy as np
 from mcp.server.fastmcp import FastMCP
 
 logger = logging.getLogger(__name__)
 
+# Limits that keep a single expression cheap to evaluate
+MAX_EXPRESSION_LENGTH = 1000
+# Integer results are exact, so their size is bounded; floats overflow on their own
+MAX_INTEGER_BITS = 4096
+# round() builds 10**ndigits internally, so its precision argument is bounded too
+MAX_ROUND_DIGITS = 15
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+def _round(value: Union[int, float], ndigits: Optional[int] = None) -> Union[int, float]:
+    if ndigits is not None and abs(ndigits) > MAX_ROUND_DIGITS:
+        raise ValueError(f"round() precision must be within ±{MAX_ROUND_DIGITS} digits")
+    return round(value, ndigits)
+
+
+FUNCTIONS = {
+    "abs": abs,
+    "round": _round,
+    "min": min,
+    "max": max,
+    "sum": lambda *args: math.fsum(args),
+    "sqrt": math.sqrt,
+    "ceil": math.ceil,
+    "floor": math.floor,
+    "log": math.log,
+    "exp": math.exp,
+}
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+AGGREGATES = {
+    "sum": np.sum,
+    "mean": np.mean,
+    "median": np.median,
+    "min": np.min,
+    "max": np.max,
+    "std": np.std,
+}
+
 # Create the MCP server instance named "Calculator"
 mcp = FastMCP("Calculator")
 
@@ -44,5 +97,121 @@ def divide(a: float, b: float) -> float:
     return result
 
 
+def _check_result_size(op: ast.operator, left: Union[int, float], right: Union[int, float]):
+    """Reject integer products and powers whose result would exceed MAX_INTEGER_BITS."""
+    if not (isinstance(left, int) and isinstance(right, int)):
+        return
+    if isinstance(op, ast.Mult):
+        bits = left.bit_length() + right.bit_length()
+    elif isinstance(op, ast.Pow) and right > 0 and left:
+        bits = right * math.log2(abs(left))
+    else:
+        return
+    if bits > MAX_INTEGER_BITS:
+        raise ValueError(f"Result larger than {MAX_INTEGER_BITS} bits")
+
+
+def _eval_node(node: ast.AST, names: dict[str, float]) -> Union[int, float]:
+    """Evaluate a whitelisted arithmetic AST node; anything else is rejected."""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id in names:
+            return names[node.id]
+        if node.id in CONSTANTS:
+            return CONSTANTS[node.id]
+        raise ValueError(f"Unknown name: {node.id}")
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left = _eval_node(node.left, names)
+        right = _eval_node(node.right, names)
+        _check_result_size(node.op, left, right)
+        return BINARY_OPERATORS[type(node.op)](left, right)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return UNARY_OPERATORS[type(node.op)](_eval_node(node.operand, names))
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in FUNCTIONS
+        and not node.keywords
+    ):
+        args = [_eval_node(arg, names) for arg in node.args]
+        return FUNCTIONS[node.func.id](*args)
+    raise ValueError(f"Unsupported expression: {type(node).__name__}")
+
+
+def evaluate_expression(expression: str, names: Optional[dict[str, float]] = None):
+    """
+    Safely evaluate one arithmetic expression, optionally of the form
+    "name = expression". Returns (name or None, value).
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"Expression longer than {MAX_EXPRESSION_LENGTH} characters")
+    body = ast.parse(expression.strip()).body
+    if len(body) != 1:
+        raise ValueError("Expected a single expression")
+    statement = body[0]
+    if isinstance(statement, ast.Expr):
+        return None, _eval_node(statement.value, names or {})
+    if (
+        isinstance(statement, ast.Assign)
+        and len(statement.targets) == 1
+        and isinstance(statement.targets[0], ast.Name)
+        and statement.targets[0].id not in CONSTANTS
+    ):
+        return statement.targets[0].id, _eval_node(statement.value, names or {})
+    raise ValueError("Expected an expression or 'name = expression'")
+
+
+@mcp.tool()
+def evaluate(expressions: list[str]) -> str:
+    """
+    Evaluate several arithmetic expressions in one call, e.g. a whole cost sheet.
+    Supports + - * / // % ** and parentheses, the functions abs, round, min,
+    max, sum, sqrt, ceil, floor, log, exp, and the constants pi and e.
+    An expression may assign a name ("hotel = 3 * 120") for use in later
+    expressions ("total = hotel + car"). Returns one line per expression.
+    """
+    logger.info(f"Tool 'evaluate' invoked with {len(expressions)} expressions")
+    names: dict[str, float] = {}
+    lines = []
+    for expression in expressions:
+        try:
+            target, value = evaluate_expression(expression, names)
+            if target:
+                names[target] = value
+            lines.append(f"{expression.strip()} => {value:.10g}")
+        except Exception as e:
+            # One bad expression does not spoil the rest of the batch
+            lines.append(f"{expression.strip()} => Error: {e}")
+    result = "\n".join(lines)
+    logger.info(f"Tool 'evaluate' returning result={result}")
+    return result
+
+
+@mcp.tool()
+def aggregate(values: list[float], op: str, percentile: Optional[float] = None) -> float:
+    """
+    Aggregate a list of numbers in one call.
+    op is one of sum, mean, median, min, max, std, or percentile (which
+    needs percentile between 0 and 100).
+    """
+    logger.info(f"Tool 'aggregate' invoked with op={op} over {len(values)} values")
+    if not values:
+        raise ValueError("values must not be empty")
+    array = np.asarray(values, dtype=float)
+    if op == "percentile":
+        if percentile is None or not 0 <= percentile <= 100:
+            raise ValueError("percentile must be between 0 and 100")
+        result = float(np.percentile(array, percentile))
+    elif op in AGGREGATES:
+        result = float(AGGREGATES[op](array))
+    else:
+        raise ValueError(
+            f"Unknown op: {op}. Use one of {', '.join([*AGGREGATES, 'percentile'])}"
+        )
+    logger.info(f"Tool 'aggregate' returning result={result}")
+    return result
+
+
 if __name__ == "__main__":
     mcp.run(transport="stdio")
@@ -259,11 +259,12 @@ Converted: {dt_target.strftime("%Y-%m-%d %H:%M:%S %Z%z")}"""
         self.mcp.run(transport=transport)
 
 
-async def serve():
+def create_server() -> Server:
     """
-    Initialize and run the datetime server.
+    Build the datetime MCP server without attaching a transport.
     """
     server = Server("datetime-server")
+    datetime_server = DateTimeServer()
 
     @server.list_tools()
     async def list_tools() -> list[Tool]:
@@ -368,7 +369,6 @@ async def serve():
     ) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
         """Handle tool calls for date and time queries."""
         try:
-            datetime_server = DateTimeServer()
             result = ""
 
             if name == DateTimeTools.GET_CURRENT_DATE.value:
@@ -405,6 +405,15 @@ async def serve():
             logger.exception(f"Error processing datetime tool call: {str(e)}")
             raise McpError(f"Error processing datetime tool call: {str(e)}")
 
+    return server
+
+
+async def serve():
+    """
+    Initialize and run the datetime server.
+    """
+    server = create_server()
+
     # Run the server with stdio transport
     options = server.create_initialization_options()
     async with stdio_server() as (read_stream, write_stream):
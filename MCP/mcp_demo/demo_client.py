@@ -5,9 +5,9 @@ import sys
 
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_openai import AzureChatOpenAI
 from langgraph.prebuilt import create_react_agent
+from mcp_common.lazy_registry import LazyServerRegistry
 
 # Configure logging
 logging.basicConfig(
@@ -47,7 +47,8 @@ async def main():
         print(f"Error initializing model: {e}")
         return
 
-    # Define MCP server parameters
+    # Define MCP server parameters. Servers with an "in_process" target run in this
+    # process unless MCP_IN_PROCESS_SERVERS=0 (see mcp_common.lazy_registry).
     server_params = {
         "google_search": {
             "command": "python",
@@ -59,12 +60,14 @@ async def main():
             "command": "python",
             "args": ["./calculator_server.py"],
             "transport": "stdio",
+            "in_process": "calculator_server:mcp",
             "capture_output": True,
         },
         "gocar": {
             "command": "python",
             "args": ["./gocar_server.py"],
             "transport": "stdio",
+            "in_process": "gocar_server:create_server",
             "capture_output": True,
         },
         "weather": {
@@ -77,16 +80,18 @@ async def main():
             "command": "python",
             "args": ["./datetime_server.py"],
             "transport": "stdio",
+            "in_process": "datetime_server:create_server",
             "capture_output": True,
         },
     }
 
     # Connect to the MCP servers
     try:
-        logger.info("Connecting to MCP servers")
-        async with MultiServerMCPClient(server_params) as client:
-            logger.info("Successfully connected to MCP servers")
-            tools = client.get_tools()
+        # Servers start on the first call to one of their tools, not here
+        logger.info("Loading MCP tool schemas")
+        async with LazyServerRegistry(server_params) as registry:
+            tools = await registry.get_tools()
+            logger.info(f"Loaded {len(tools)} tools")
 
             # Create a system prompt that emphasizes travel planning and tool usage
             system_prompt = """You are a helpful travel assistant with access to various tools that can help plan the perfect trip.
@@ -95,7 +100,7 @@ ALWAYS use the appropriate tools when information is needed:
 - Google Search: For finding places to visit, attractions, restaurants, and general travel information
 - Weather: For checking weather forecasts at travel destinations
 - GoCar: For finding available car types and rental rates
-- Calculator: For any calculations needed during trip planning
+- Calculator: For any calculations needed during trip planning; use evaluate to compute a whole cost breakdown in one call
 
 TRAVEL PLANNING GUIDELINES:
 - Structure itineraries by day with morning, afternoon, and evening activities
@@ -357,11 +357,12 @@ class GoCarServer:
         self.mcp.run(transport=transport)
 
 
-async def serve():
+def create_server() -> Server:
     """
-    Initialize and run the GoCar server.
+    Build the GoCar MCP server without attaching a transport.
     """
     server = Server("gocar-server")
+    gocar_server = GoCarServer()
 
     @server.list_tools()
     async def list_tools() -> list[Tool]:
@@ -428,7 +429,6 @@ async def serve():
     ) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
         """Handle tool calls for GoCar queries."""
         try:
-            gocar_server = GoCarServer()
             result = ""
 
             if name == GoCarTools.GET_CAR_TYPES.value:
@@ -462,6 +462,15 @@ async def serve():
             logger.exception(f"Error processing GoCar tool call: {str(e)}")
             raise McpError(f"Error processing GoCar tool call: {str(e)}")
 
+    return server
+
+
+async def serve():
+    """
+    Initialize and run the GoCar server.
+    """
+    server = create_server()
+
     # Run the server with stdio transport
     options = server.create_initialization_options()
     async with stdio_server() as (read_stream, write_stream):
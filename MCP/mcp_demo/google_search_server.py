@@ -1,8 +1,12 @@
 # google_search_server.py
+import asyncio
 import logging
+import os
+import time
+from collections import OrderedDict
 
 import dotenv
-from langchain_google_community import GoogleSearchAPIWrapper
+import httpx
 from mcp.server.fastmcp import FastMCP
 
 # Load environment variables.
@@ -10,29 +14,134 @@ dotenv.load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+SEARCH_CACHE_TTL = int(os.getenv("GOOGLE_SEARCH_CACHE_TTL_SECONDS", "900"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("GOOGLE_SEARCH_CACHE_MAX_ENTRIES", "512"))
+SEARCH_MAX_CONCURRENCY = int(os.getenv("GOOGLE_SEARCH_MAX_CONCURRENCY", "5"))
+SEARCH_TIMEOUT = float(os.getenv("GOOGLE_SEARCH_TIMEOUT_SECONDS", "15"))
+
+CUSTOM_SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+NO_RESULTS = "No results found."
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class SearchClient:
+    """
+    Google Programmable Search over one long-lived HTTP client. Returns the
+    result snippets joined by spaces, like GoogleSearchAPIWrapper.run.
+
+    Results are cached by normalized query for ``ttl_seconds``, and concurrent
+    identical queries share one request.
+    Ensure that the environment variables GOOGLE_API_KEY and GOOGLE_CSE_ID are set.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = SEARCH_CACHE_TTL,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        num_results: int = 10,
+    ):
+        self.api_key = os.getenv("GOOGLE_API_KEY")
+        self.cse_id = os.getenv("GOOGLE_CSE_ID")
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.num_results = num_results
+        self.http = httpx.AsyncClient(
+            timeout=SEARCH_TIMEOUT,
+            limits=httpx.Limits(max_connections=SEARCH_MAX_CONCURRENCY),
+        )
+        # normalized query -> (stored_at, result)
+        self.entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        # normalized query -> the request currently running for it
+        self.inflight: dict[str, asyncio.Task] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    async def search(self, query: str) -> str:
+        key = normalize_query(query)
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+        task = self.inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.create_task(self._fetch(key, query))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # Shielded, so one caller giving up does not cancel the search for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, query: str) -> str:
+        if not self.api_key or not self.cse_id:
+            raise RuntimeError("GOOGLE_API_KEY and GOOGLE_CSE_ID must be set")
+        params = {
+            "key": self.api_key,
+            "cx": self.cse_id,
+            "q": query,
+            "num": str(self.num_results),
+        }
+        response = await self.http.get(CUSTOM_SEARCH_URL, params=params)
+        response.raise_for_status()
+        items = response.json().get("items", [])
+        result = " ".join(item["snippet"] for item in items if "snippet" in item)
+
+        self.entries[key] = (time.monotonic(), result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return result
+
+
+search_client = SearchClient()
+
 # Create the MCP server instance named "GoogleSearch"
 mcp = FastMCP("GoogleSearch")
 
 
 @mcp.tool()
-def google_search(query: str) -> str:
+async def google_search(query: str) -> str:
     """
-    Use the GoogleSearchAPIWrapper to perform a Google search.
+    Perform a Google search and return the result snippets.
     Ensure that the environment variables GOOGLE_API_KEY and GOOGLE_CSE_ID are set.
     """
     try:
-        search = GoogleSearchAPIWrapper()  # Uses the env vars automatically
         logger.info(f"GoogleSearch tool invoked with query: {query}")
-        result = search.run(query)
+        result = await search_client.search(query)
         logger.info(f"GoogleSearch tool result: {result}")
         if not result:
-            return "No results found."
+            return NO_RESULTS
         return result
     except Exception as e:
         logger.exception("Error executing Google search")
         return f"Error executing Google search: {str(e)}"
 
 
+@mcp.tool()
+async def google_search_many(queries: list[str]) -> str:
+    """
+    Perform several Google searches concurrently, e.g. one per destination.
+    Returns one section per query, headed by the query.
+    Ensure that the environment variables GOOGLE_API_KEY and GOOGLE_CSE_ID are set.
+    """
+    logger.info(f"GoogleSearch batch tool invoked with {len(queries)} queries")
+    semaphore = asyncio.Semaphore(SEARCH_MAX_CONCURRENCY)
+
+    async def run(query: str) -> str:
+        async with semaphore:
+            return await google_search(query)
+
+    results = await asyncio.gather(*(run(query) for query in queries))
+    return "\n\n".join(
+        f"### {query}\n{result}" for query, result in zip(queries, results)
+    )
+
+
 if __name__ == "__main__":
     # Run with stdio transport.
     mcp.run(transport="stdio")
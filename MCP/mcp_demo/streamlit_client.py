@@ -1,7 +1,13 @@
 import asyncio
+import atexit
+import concurrent.futures
 import logging
 import os
+import queue
 import sys
+import threading
+import time
+from collections.abc import Iterator
 
 # Use ProactorEventLoop on Windows for subprocess compatibility
 if sys.platform == "win32":
@@ -10,9 +16,9 @@ if sys.platform == "win32":
 import streamlit as st
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_openai import AzureChatOpenAI
 from langgraph.prebuilt import create_react_agent
+from mcp_common.lazy_registry import LazyServerRegistry
 
 # Configure logging
 logging.basicConfig(
@@ -27,7 +33,8 @@ if load_dotenv():
 else:
     logger.warning("No .env file found. Ensure environment variables are set.")
 
-# Define MCP server parameters
+# Define MCP server parameters. Servers with an "in_process" target run in this
+# process unless MCP_IN_PROCESS_SERVERS=0 (see mcp_common.lazy_registry).
 server_params = {
     "google_search": {
         "command": "python",
@@ -39,12 +46,14 @@ server_params = {
         "command": "python",
         "args": ["./calculator_server.py"],
         "transport": "stdio",
+        "in_process": "calculator_server:mcp",
         "capture_output": True,
     },
     "gocar": {
         "command": "python",
         "args": ["./gocar_server.py"],
         "transport": "stdio",
+        "in_process": "gocar_server:create_server",
         "capture_output": True,
     },
     "weather": {
@@ -57,6 +66,7 @@ server_params = {
         "command": "python",
         "args": ["./datetime_server.py"],
         "transport": "stdio",
+        "in_process": "datetime_server:create_server",
         "capture_output": True,
     },
 }
@@ -107,28 +117,14 @@ def extract_final_ai_response(response):
         return f"Error processing response: {str(e)}"
 
 
-async def run_agent(query):
-    try:
-        # Initialize the Azure OpenAI model
-        model = AzureChatOpenAI(
-            azure_endpoint=os.environ["OPENAI_API_HOST"],
-            azure_deployment="gpt-4o",
-            openai_api_version="2024-11-20",
-            streaming=True,
-        )
-
-        # Connect to the MCP servers
-        async with MultiServerMCPClient(server_params) as client:
-            tools = client.get_tools()
-
-            # Create a system prompt for the agent
-            system_prompt = """You are a helpful travel assistant with access to various tools that can help plan the perfect trip.
+# System prompt for the travel agent
+SYSTEM_PROMPT = """You are a helpful travel assistant with access to various tools that can help plan the perfect trip.
 
 ALWAYS use the appropriate tools when information is needed:
 - Google Search: For finding places to visit, attractions, restaurants, and general travel information
 - Weather: For checking weather forecasts at travel destinations
 - GoCar: For finding available car types and rental rates
-- Calculator: For any calculations needed during trip planning
+- Calculator: For any calculations needed during trip planning; use evaluate to compute a whole cost breakdown in one call
 
 TRAVEL PLANNING GUIDELINES:
 - Structure itineraries by day with morning, afternoon, and evening activities
@@ -148,39 +144,259 @@ When creating a multi-day itinerary:
 Remember to be thorough in your research and thoughtful in your recommendations.
 """
 
-            # Create a reactive agent with the custom system prompt
-            agent = create_react_agent(model, tools, prompt=system_prompt)
+# Seconds between MCP server pings, and how long a ping or a query may take
+HEALTH_CHECK_INTERVAL = float(os.getenv("MCP_HEALTH_CHECK_INTERVAL_SECONDS", "30"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("MCP_HEALTH_CHECK_TIMEOUT_SECONDS", "5"))
+AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT_SECONDS", "300"))
 
-            # Create proper HumanMessage object
-            messages = [HumanMessage(content=query)]
 
-            # Invoke the agent and return the full response object
-            return await agent.ainvoke({"messages": messages})
+class AgentStream:
+    """
+    Iterates over the events of one streamed agent turn as they arrive:
+    ("llm_start", None), ("token", text), ("tool_start", {"name", "input"})
+    and ("tool_end", {"name"}). Cancelling stops the turn on the agent loop.
+    """
 
+    _DONE = object()
+
+    def __init__(self, manager: "MCPSessionManager", query: str):
+        self.events: queue.Queue = queue.Queue()
+        self.future = asyncio.run_coroutine_threadsafe(
+            manager._stream(query, self.events.put), manager.loop
+        )
+        self.future.add_done_callback(lambda _: self.events.put(self._DONE))
+
+    def cancel(self):
+        self.future.cancel()
+
+    def __iter__(self) -> Iterator[tuple]:
+        try:
+            while True:
+                # AGENT_TIMEOUT bounds the gap between events, not the whole turn
+                try:
+                    event = self.events.get(timeout=AGENT_TIMEOUT)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"No agent progress for {AGENT_TIMEOUT:g} seconds "
+                        "(AGENT_TIMEOUT_SECONDS)"
+                    ) from None
+                if event is self._DONE:
+                    break
+                yield event
+            # Re-raise any error from the agent run; a cancelled run just ends
+            if not self.future.cancelled():
+                self.future.result()
+        finally:
+            self.cancel()
+
+
+class MCPSessionManager:
+    """
+    Keeps the MCP server subprocesses, their tools and the agent graph alive
+    for the lifetime of the Streamlit process.
+
+    All MCP I/O runs on one background event loop, since the stdio sessions
+    are bound to the loop that opened them. Servers start on first use of
+    their tools (see mcp_common.lazy_registry). Running servers are pinged
+    before a query at most every HEALTH_CHECK_INTERVAL seconds; one that
+    stopped answering is shut down and respawned when its tools are next
+    called.
+    """
+
+    def __init__(self, params: dict):
+        self.params = params
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="mcp-session-loop", daemon=True
+        )
+        self._thread.start()
+
+        self.model = None
+        self.registry = None
+        self.agent = None
+        self._lock = asyncio.Lock()
+        self._last_checked = 0.0
+
+    def _submit(self, coro, timeout=None):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # Stop the coroutine as well, so a timed-out query does not keep running
+            future.cancel()
+            raise
+
+    async def _connect(self):
+        started = time.perf_counter()
+        if self.model is None:
+            # Initialize the Azure OpenAI model
+            self.model = AzureChatOpenAI(
+                azure_endpoint=os.environ["OPENAI_API_HOST"],
+                azure_deployment="gpt-4o",
+                openai_api_version="2024-11-20",
+                streaming=True,
+            )
+
+        # Load tool schemas; servers start when their tools are first called
+        self.registry = LazyServerRegistry(self.params)
+        tools = await self.registry.get_tools()
+
+        # Create a reactive agent with the custom system prompt
+        self.agent = create_react_agent(self.model, tools, prompt=SYSTEM_PROMPT)
+        self._last_checked = time.monotonic()
+        logger.info(
+            f"Loaded {len(tools)} tools from {len(self.params)} MCP servers "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    async def _disconnect(self):
+        if self.registry is not None:
+            await self.registry.close()
+        self.registry = self.agent = None
+
+    async def _ensure_ready(self):
+        async with self._lock:
+            if self.agent is None:
+                await self._connect()
+            elif time.monotonic() - self._last_checked > HEALTH_CHECK_INTERVAL:
+                # Unhealthy servers are stopped here and respawned on their next call
+                await self.registry.check_health(HEALTH_CHECK_TIMEOUT)
+                self._last_checked = time.monotonic()
+
+    async def _invoke(self, query: str):
+        await self._ensure_ready()
+        try:
+            # Create proper HumanMessage object
+            messages = [HumanMessage(content=query)]
+            return await self.agent.ainvoke({"messages": messages})
+        except Exception:
+            # Check the servers before the next query rather than after the interval
+            self._last_checked = 0.0
+            raise
+
+    async def _stream(self, query: str, emit):
+        await self._ensure_ready()
+        try:
+            messages = [HumanMessage(content=query)]
+            async for event in self.agent.astream_events(
+                {"messages": messages}, version="v2"
+            ):
+                kind = event["event"]
+                if kind == "on_chat_model_start":
+                    emit(("llm_start", None))
+                elif kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content and isinstance(content, str):
+                        emit(("token", content))
+                elif kind == "on_tool_start":
+                    emit(
+                        (
+                            "tool_start",
+                            {"name": event["name"], "input": event["data"].get("input")},
+                        )
+                    )
+                elif kind == "on_tool_end":
+                    emit(("tool_end", {"name": event["name"]}))
+        except Exception:
+            self._last_checked = 0.0
+            raise
+
+    def stream(self, query: str) -> AgentStream:
+        """Start one agent turn on the background loop and stream its events."""
+        return AgentStream(self, query)
+
+    def start(self):
+        """Connect to the MCP servers now instead of on the first query."""
+        self._submit(self._ensure_ready())
+
+    def run(self, query: str):
+        """Run one agent turn on the background loop and return the raw response."""
+        return self._submit(self._invoke(query), AGENT_TIMEOUT)
+
+    def close(self):
+        if self.loop.is_running():
+            self._submit(self._disconnect(), HEALTH_CHECK_TIMEOUT)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+@st.cache_resource
+def get_session_manager() -> MCPSessionManager:
+    """One warm MCP session manager per Streamlit server process."""
+    manager = MCPSessionManager(server_params)
+    atexit.register(manager.close)
+    return manager
+
+
+def run_agent(query):
+    try:
+        return get_session_manager().run(query)
     except Exception as e:
         logger.error(f"Error running agent: {e}", exc_info=True)
         return f"Error: {e}"
 
 
+def stream_agent(query):
+    """Render tool progress and the answer tokens as the agent produces them."""
+    # A new submission supersedes the query still running for this browser session
+    previous = st.session_state.pop("agent_stream", None)
+    if previous is not None:
+        previous.cancel()
+
+    status = st.status("Processing...")
+    answer = st.empty()
+    text = ""
+    agent_stream = None
+    try:
+        agent_stream = get_session_manager().stream(query)
+        st.session_state["agent_stream"] = agent_stream
+        for kind, payload in agent_stream:
+            if kind == "llm_start":
+                # Only the last model call's text is the final answer
+                text = ""
+            elif kind == "token":
+                text += payload
+                answer.markdown(text + "▌", unsafe_allow_html=True)
+            elif kind == "tool_start":
+                status.update(label=f"Calling {payload['name']}...")
+                status.write(f"`{payload['name']}` {payload['input']}")
+        if not text:
+            text = "I'm sorry, I couldn't come up with an answer based on the available tools."
+        answer.markdown(text, unsafe_allow_html=True)
+        status.update(label="Done", state="complete", expanded=False)
+    except Exception as e:
+        logger.error(f"Error streaming agent: {e}", exc_info=True)
+        status.update(label="Error", state="error")
+        answer.markdown(f"Error: {e}")
+    finally:
+        # Also reached when Streamlit stops this run for a rerun
+        if agent_stream is not None:
+            agent_stream.cancel()
+            if st.session_state.get("agent_stream") is agent_stream:
+                del st.session_state["agent_stream"]
+
+
 def main():
     st.title("Travel Itinerary Assistant")
 
     # Input box for user query
     query = st.text_input("Enter your query:", "")
+    streaming = st.toggle("Stream response", value=True)
 
     if st.button("Submit"):
-        if query.strip():
+        if not query.strip():
+            st.warning("Please enter a query before submitting.")
+        elif streaming:
+            stream_agent(query)
+        else:
             with st.spinner("Processing..."):
-                # Run the agent and get the raw response
-                raw_response = asyncio.run(run_agent(query))
+                # Run the agent on the shared MCP sessions and get the raw response
+                raw_response = run_agent(query)
 
                 # Extract the final AI response
                 final_response = extract_final_ai_response(raw_response)
 
                 # Display the clean response
                 st.markdown(final_response, unsafe_allow_html=True)
-        else:
-            st.warning("Please enter a query before submitting.")
 
 
 if __name__ == "__main__":
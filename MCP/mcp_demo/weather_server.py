@@ -1,7 +1,11 @@
+import asyncio
 import json
 import logging
 import os
-from collections.abc import Sequence
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Sequence
+from contextlib import asynccontextmanager
 from enum import Enum
 from pathlib import Path
 from typing import Any, Optional
@@ -22,7 +26,16 @@ logger = logging.getLogger(__name__)
 
 # Cache configuration
 CACHE_DIR = Path.home() / ".cache" / "weather"
-LOCATION_CACHE_FILE = CACHE_DIR / "location_cache.json"
+# Append-only JSON lines: one {"location", "key", "data"} record per resolved location
+LOCATION_CACHE_FILE = CACHE_DIR / "location_cache.jsonl"
+
+# How long API responses are reused, in seconds
+CURRENT_CONDITIONS_TTL = int(os.getenv("WEATHER_CURRENT_TTL_SECONDS", "600"))
+FORECAST_TTL = int(os.getenv("WEATHER_FORECAST_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = 256
+
+# Maximum concurrent location lookups/forecast fetches in get_forecasts_batch
+BATCH_MAX_CONCURRENCY = int(os.getenv("WEATHER_BATCH_MAX_CONCURRENCY", "5"))
 
 
 class WeatherTools(str, Enum):
@@ -30,6 +43,7 @@ class WeatherTools(str, Enum):
 
     GET_CURRENT_WEATHER = "get_current_weather"
     GET_FORECAST = "get_forecast"
+    GET_FORECASTS_BATCH = "get_forecasts_batch"
 
 
 class WeatherServer:
@@ -51,54 +65,86 @@ class WeatherServer:
         logger.info(f"NO_PROXY settings: {self.no_proxy}")
         logger.info(f"AccuWeather API key available: {'Yes' if self.api_key else 'No'}")
 
+        # One HTTP session for the server's lifetime, created on first use
+        self._session: Optional[ClientSession] = None
+        self._session_lock = asyncio.Lock()
+
+        # location -> (location key, location data), loaded once from disk
+        self._location_cache: dict[str, tuple[str, dict[str, Any]]] = (
+            self._load_location_cache()
+        )
+
+        # (url, params) -> (expires_at, JSON data) for conditions and forecasts
+        self._response_cache: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+
         self.setup_tools()
 
     def setup_tools(self):
         """Register all tools with the MCP server."""
         self.mcp.tool()(self.get_current_weather)
         self.mcp.tool()(self.get_forecast)
+        self.mcp.tool()(self.get_forecasts_batch)
 
-    def get_cached_location_key(self, location: str) -> Optional[str]:
+    @staticmethod
+    def _normalize_location(location: str) -> str:
+        return " ".join(location.lower().split())
+
+    def _load_location_cache(self) -> dict[str, tuple[str, dict[str, Any]]]:
+        """
+        Read the on-disk location cache into memory.
+
+        Later lines win, and a torn last line from an interrupted write is skipped.
         """
-        Get location key from cache.
+        cache = {}
+        if not LOCATION_CACHE_FILE.exists():
+            return cache
+
+        with open(LOCATION_CACHE_FILE) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    cache[entry["location"]] = (entry["key"], entry["data"])
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+        logger.info(f"Loaded {len(cache)} cached locations")
+        return cache
+
+    def get_cached_location(
+        self, location: str
+    ) -> Optional[tuple[str, dict[str, Any]]]:
+        """
+        Get a location key and its location data from the in-memory cache.
 
         Args:
             location: The location to get the key for.
 
         Returns:
-            The location key if found in cache, None otherwise.
+            A (location key, location data) tuple if cached, None otherwise.
         """
-        if not LOCATION_CACHE_FILE.exists():
-            return None
+        return self._location_cache.get(self._normalize_location(location))
 
-        try:
-            with open(LOCATION_CACHE_FILE) as f:
-                cache = json.load(f)
-                return cache.get(location)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return None
-
-    def cache_location_key(self, location: str, location_key: str):
+    def cache_location(self, location: str, location_key: str, location_data: dict):
         """
-        Cache location key for future use.
+        Cache a resolved location in memory and append it to the on-disk store.
 
         Args:
             location: The location to cache the key for.
             location_key: The location key to cache.
+            location_data: The full location data returned by the API.
         """
-        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        normalized = self._normalize_location(location)
+        self._location_cache[normalized] = (location_key, location_data)
 
         try:
-            if LOCATION_CACHE_FILE.exists():
-                with open(LOCATION_CACHE_FILE) as f:
-                    cache = json.load(f)
-            else:
-                cache = {}
-
-            cache[location] = location_key
-
-            with open(LOCATION_CACHE_FILE, "w") as f:
-                json.dump(cache, f, indent=2)
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # A single appended line per entry; readers never see a half-rewritten file
+            with open(LOCATION_CACHE_FILE, "a") as f:
+                f.write(
+                    json.dumps(
+                        {"location": normalized, "key": location_key, "data": location_data}
+                    )
+                    + "\n"
+                )
         except Exception as e:
             logger.warning(f"Failed to cache location key: {e}")
 
@@ -129,6 +175,66 @@ class WeatherServer:
 
         return True
 
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[ClientSession]:
+        """
+        Yield the shared aiohttp session, creating it on first use.
+
+        The session and its connection pool stay open for the server's lifetime;
+        call ``close`` on shutdown.
+        """
+        if self._session is None or self._session.closed:
+            async with self._session_lock:
+                if self._session is None or self._session.closed:
+                    self._session = await self._create_client_session()
+        yield self._session
+
+    async def close(self):
+        """Close the shared HTTP session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _fetch_json(
+        self,
+        session: ClientSession,
+        url: str,
+        params: dict[str, Any],
+        ttl: float,
+        description: str,
+    ) -> Any:
+        """
+        GET a JSON document, reusing a cached copy for ``ttl`` seconds.
+
+        Raises:
+            Exception: If the API returns a non-200 status.
+        """
+        cache_key = (
+            url,
+            tuple(sorted((k, str(v)) for k, v in params.items() if k != "apikey")),
+        )
+        cached = self._response_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            logger.info(f"Using cached {description} for {url}")
+            self._response_cache.move_to_end(cache_key)
+            return cached[1]
+
+        async with session.get(url, params=params) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                error_message = (
+                    f"Error fetching {description}: {response.status}, {error_text}"
+                )
+                logger.error(error_message)
+                raise Exception(error_message)
+
+            data = await response.json()
+
+        self._response_cache[cache_key] = (time.monotonic() + ttl, data)
+        self._response_cache.move_to_end(cache_key)
+        while len(self._response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+            self._response_cache.popitem(last=False)
+        return data
+
     async def _create_client_session(self) -> ClientSession:
         """
         Create an aiohttp client session with appropriate proxy settings.
@@ -174,15 +280,13 @@ class WeatherServer:
         Raises:
             Exception: If the location cannot be found or the API request fails.
         """
-        # Try to get location key from cache first
-        cached_key = self.get_cached_location_key(location)
-        if cached_key:
-            logger.info(f"Using cached location key for {location}: {cached_key}")
-            # Since we only have the key in cache but not the full location data,
-            # we'll still need to make an API call to get the location details
-            # so we'll proceed with the API call as if no cache was found
-
-        # If not in cache or we need full location data, request from API
+        # Try to get location key and data from cache first
+        cached = self.get_cached_location(location)
+        if cached:
+            logger.info(f"Using cached location key for {location}: {cached[0]}")
+            return cached
+
+        # If not in cache, request from API
         location_search_url = f"{self.base_url}/locations/v1/cities/search"
         params = {
             "apikey": self.api_key,
@@ -269,7 +373,7 @@ class WeatherServer:
                 )
 
                 # Cache the location key for future use
-                self.cache_location_key(location, location_key)
+                self.cache_location(location, location_key, selected_location)
 
                 return location_key, selected_location
         except aiohttp.ClientError as e:
@@ -301,7 +405,7 @@ class WeatherServer:
                     "AccuWeather API key not found. Please set the ACCUWEATHER_API_KEY environment variable."
                 )
 
-            async with await self._create_client_session() as session:
+            async with self.session() as session:
                 # Get location key
                 location_key, location_data = await self.get_location_key(
                     location, session
@@ -317,19 +421,16 @@ class WeatherServer:
                     f"Requesting current conditions from: {current_conditions_url}"
                 )
 
-                async with session.get(
-                    current_conditions_url, params=params
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        error_message = f"Error fetching current weather data: {response.status}, {error_text}"
-                        logger.error(error_message)
-                        raise Exception(error_message)
-
-                    current_conditions = await response.json()
+                current_conditions = await self._fetch_json(
+                    session,
+                    current_conditions_url,
+                    params,
+                    CURRENT_CONDITIONS_TTL,
+                    "current weather data",
+                )
 
-                    if not current_conditions or len(current_conditions) == 0:
-                        return f"No current weather data available for {location}"
+                if not current_conditions or len(current_conditions) == 0:
+                    return f"No current weather data available for {location}"
 
                 # Format response
                 current = current_conditions[0]
@@ -428,29 +529,11 @@ class WeatherServer:
                     f"Invalid days parameter: {days}. Using default value of 5."
                 )
 
-            async with await self._create_client_session() as session:
-                # Get location key
-                location_key, location_data = await self.get_location_key(
-                    location, session
+            async with self.session() as session:
+                location_data, forecast_data = await self._fetch_forecast(
+                    session, location, days
                 )
 
-                # Get forecast
-                forecast_url = (
-                    f"{self.base_url}/forecasts/v1/daily/{days}day/{location_key}"
-                )
-                params = {"apikey": self.api_key, "metric": "true", "details": "true"}
-
-                logger.info(f"Requesting forecast from: {forecast_url}")
-
-                async with session.get(forecast_url, params=params) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        error_message = f"Error fetching forecast data: {response.status}, {error_text}"
-                        logger.error(error_message)
-                        raise Exception(error_message)
-
-                    forecast_data = await response.json()
-
                 # Format response
                 location_name = location_data["LocalizedName"]
                 country = location_data["Country"]["LocalizedName"]
@@ -514,6 +597,90 @@ class WeatherServer:
             logger.exception(f"Error getting forecast for {location}")
             return f"Error getting forecast for {location}: {str(e)}"
 
+    async def _fetch_forecast(
+        self, session: ClientSession, location: str, days: int
+    ) -> tuple[dict[str, Any], dict[str, Any]]:
+        """Resolve a location and fetch its daily forecast. Returns (location data, forecast data)."""
+        # Get location key
+        location_key, location_data = await self.get_location_key(location, session)
+
+        # Get forecast
+        forecast_url = f"{self.base_url}/forecasts/v1/daily/{days}day/{location_key}"
+        params = {"apikey": self.api_key, "metric": "true", "details": "true"}
+
+        logger.info(f"Requesting forecast from: {forecast_url}")
+
+        forecast_data = await self._fetch_json(
+            session, forecast_url, params, FORECAST_TTL, "forecast data"
+        )
+        return location_data, forecast_data
+
+    async def get_forecasts_batch(self, locations: list[str], days: int = 5) -> str:
+        """
+        Get the weather forecast for several locations in one call.
+
+        Locations are resolved and fetched concurrently (at most
+        BATCH_MAX_CONCURRENCY at a time) and repeated locations are fetched once.
+
+        Args:
+            locations: The locations to get forecasts for.
+            days: The number of days to forecast (5 or 10).
+
+        Returns:
+            A compact forecast with one line per location and day.
+        """
+        logger.info(
+            f"Weather tool 'get_forecasts_batch' invoked with locations: {locations}, days: {days}"
+        )
+
+        if not self.api_key:
+            return "Error getting forecasts: AccuWeather API key not found. Please set the ACCUWEATHER_API_KEY environment variable."
+
+        if days not in [5, 10]:
+            logger.warning(f"Invalid days parameter: {days}. Using default value of 5.")
+            days = 5
+
+        # Deduplicate while keeping the caller's order
+        unique_locations = {}
+        for location in locations:
+            unique_locations.setdefault(self._normalize_location(location), location)
+
+        semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+        async def fetch(location: str) -> str:
+            async with semaphore:
+                try:
+                    location_data, forecast_data = await self._fetch_forecast(
+                        session, location, days
+                    )
+                except Exception as e:
+                    logger.exception(f"Error getting forecast for {location}")
+                    return f"## {location}\nError: {str(e)}"
+
+            name = f"{location_data['LocalizedName']}, {location_data['Country']['LocalizedName']}"
+            lines = [f"## {name}"]
+            for day in forecast_data.get("DailyForecasts", []):
+                lines.append(
+                    f"{day['Date'][:10]}: "
+                    f"{day['Temperature']['Minimum']['Value']}-{day['Temperature']['Maximum']['Value']}°C, "
+                    f"{day.get('Day', {}).get('IconPhrase', 'N/A')} / "
+                    f"{day.get('Night', {}).get('IconPhrase', 'N/A')}, "
+                    f"rain {day.get('Day', {}).get('RainProbability', 'N/A')}%/"
+                    f"{day.get('Night', {}).get('RainProbability', 'N/A')}%"
+                )
+            return "\n".join(lines)
+
+        async with self.session() as session:
+            sections = await asyncio.gather(
+                *(fetch(location) for location in unique_locations.values())
+            )
+
+        logger.info(
+            f"Weather tool 'get_forecasts_batch' executed for {len(sections)} location(s)"
+        )
+        header = f"# {days}-Day Forecasts (min-max °C, day / night, rain day/night)"
+        return header + "\n\n" + "\n\n".join(sections)
+
     def run(self, transport: str = "stdio"):
         """Run the server with the specified transport."""
         self.mcp.run(transport=transport)
@@ -524,6 +691,8 @@ async def serve():
     Initialize and run the weather server.
     """
     server = Server("weather-server")
+    # Shared across tool calls so the HTTP session and caches are reused
+    weather_server = WeatherServer()
 
     @server.list_tools()
     async def list_tools() -> list[Tool]:
@@ -563,6 +732,27 @@ async def serve():
                     "required": ["location"],
                 },
             ),
+            Tool(
+                name=WeatherTools.GET_FORECASTS_BATCH.value,
+                description="Get the weather forecast for several locations in one call",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "locations": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "The locations to get forecasts for (e.g., ['London', 'Paris', 'Rome'])",
+                        },
+                        "days": {
+                            "type": "integer",
+                            "description": "The number of days to forecast (5 or 10)",
+                            "enum": [5, 10],
+                            "default": 5,
+                        },
+                    },
+                    "required": ["locations"],
+                },
+            ),
         ]
 
     @server.call_tool()
@@ -571,7 +761,6 @@ async def serve():
     ) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
         """Handle tool calls for weather queries."""
         try:
-            weather_server = WeatherServer()
             result = ""
 
             if name == WeatherTools.GET_CURRENT_WEATHER.value:
@@ -589,6 +778,14 @@ async def serve():
                 days = arguments.get("days", 5)
                 result = await weather_server.get_forecast(location, days)
 
+            elif name == WeatherTools.GET_FORECASTS_BATCH.value:
+                if "locations" not in arguments:
+                    raise ValueError("Missing required argument: locations")
+
+                locations = arguments["locations"]
+                days = arguments.get("days", 5)
+                result = await weather_server.get_forecasts_batch(locations, days)
+
             else:
                 raise ValueError(f"Unknown tool: {name}")
 
@@ -599,13 +796,14 @@ async def serve():
 
     # Run the server with stdio transport
     options = server.create_initialization_options()
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(read_stream, write_stream, options)
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, options)
+    finally:
+        await weather_server.close()
 
 
 if __name__ == "__main__":
-    import asyncio
-
     # For Python 3.7+
     try:
         asyncio.run(serve())
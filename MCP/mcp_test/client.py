@@ -5,9 +5,9 @@ import sys
 
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_openai import AzureChatOpenAI
 from langgraph.prebuilt import create_react_agent
+from mcp_common.lazy_registry import LazyServerRegistry
 
 # Configure logging
 logging.basicConfig(
@@ -80,10 +80,11 @@ async def main():
 
     # Connect to the MCP servers
     try:
-        logger.info("Connecting to MCP servers")
-        async with MultiServerMCPClient(server_params) as client:
-            logger.info("Successfully connected to MCP servers")
-            tools = client.get_tools()
+        # Servers start on the first call to one of their tools, not here
+        logger.info("Loading MCP tool schemas")
+        async with LazyServerRegistry(server_params) as registry:
+            tools = await registry.get_tools()
+            logger.info(f"Loaded {len(tools)} tools")
 
             # Create a strong system prompt that enforces date awareness
             system_prompt = """You are an AI assistant with access to various tools.
@@ -1,12 +1,25 @@
 #!/usr/bin/env python
 # stock_server.py
 
+import asyncio
+import hashlib
+import io
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import lru_cache
+from pathlib import Path
 
 import dotenv
-import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
 import yfinance as yf
-from mcp.server.fastmcp import FastMCP
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from mcp.server.fastmcp import FastMCP, Image
+
+from stock_store import create_store_from_env
 
 dotenv.load_dotenv()  # Load environment variables from .env file if needed
 
@@ -15,6 +28,25 @@ logger = logging.getLogger(__name__)
 # Create the MCP server instance named "StockAPI"
 mcp = FastMCP("StockAPI")
 
+# Daily OHLCV history shared by all tools; see stock_store.py for settings
+store = create_store_from_env()
+
+# Plots are rendered off the event loop; longer series are downsampled first
+PLOT_MAX_POINTS = int(os.getenv("STOCK_PLOT_MAX_POINTS", "1000"))
+PLOT_DIR = Path(
+    os.getenv("STOCK_PLOT_DIR", str(Path.home() / ".cache" / "stocks" / "plots"))
+)
+plot_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("STOCK_PLOT_WORKERS", "2")),
+    thread_name_prefix="stock-plot",
+)
+
+
+@lru_cache(maxsize=128)
+def get_ticker(ticker: str) -> yf.Ticker:
+    """Reuse one yfinance Ticker per symbol for calendar and earnings lookups."""
+    return yf.Ticker(ticker.upper())
+
 
 @mcp.tool()
 def get_stock_price(ticker: str) -> str:
@@ -23,10 +55,9 @@ def get_stock_price(ticker: str) -> str:
     """
     try:
         logger.info(f"get_stock_price invoked for ticker: {ticker}")
-        t = yf.Ticker(ticker)
-        history = t.history(period="1d")
-        if not history.empty:
-            latest = history["Close"].iloc[-1]
+        latest_row = store.latest(ticker)
+        if latest_row is not None:
+            latest = latest_row["Close"]
             result = f"The latest price for {ticker.upper()} is {latest:.2f}."
             logger.info(result)
             return result
@@ -45,8 +76,7 @@ def get_earnings_dates(ticker: str) -> str:
     """
     try:
         logger.info(f"get_earnings_dates invoked for ticker: {ticker}")
-        t = yf.Ticker(ticker)
-        cal = t.calendar
+        cal = get_ticker(ticker).calendar
         if cal is not None and not cal.empty:
             result = cal.to_string()
             logger.info(f"get_earnings_dates result: {result}")
@@ -66,8 +96,7 @@ def get_quarterly_earnings(ticker: str) -> str:
     """
     try:
         logger.info(f"get_quarterly_earnings invoked for ticker: {ticker}")
-        t = yf.Ticker(ticker)
-        quarterly = t.quarterly_earnings
+        quarterly = get_ticker(ticker).quarterly_earnings
         if quarterly is not None and not quarterly.empty:
             result = quarterly.to_string()
             logger.info(f"get_quarterly_earnings result: {result}")
@@ -90,8 +119,7 @@ def get_stock_history(ticker: str, start_date: str, end_date: str) -> str:
         logger.info(
             f"get_stock_history invoked for ticker: {ticker} from {start_date} to {end_date}"
         )
-        t = yf.Ticker(ticker)
-        hist = t.history(start=start_date, end=end_date)
+        hist = store.history(ticker, start_date, end_date)
         if not hist.empty:
             closing_prices = hist["Close"]
             # Use .items() instead of iteritems() for compatibility with modern pandas
@@ -110,31 +138,176 @@ def get_stock_history(ticker: str, start_date: str, end_date: str) -> str:
         return f"Error retrieving historical data for {ticker.upper()}: {str(e)}"
 
 
+def compute_metrics(closes: pd.DataFrame, window: int = 20) -> pd.DataFrame:
+    """
+    Per-ticker summary of an aligned close table (dates x tickers), in one
+    vectorized pass: total return, annualized volatility and the latest
+    moving average.
+    """
+    daily_returns = closes.pct_change(fill_method=None)
+    first = closes.bfill().iloc[0]
+    last = closes.ffill().iloc[-1]
+    return pd.DataFrame(
+        {
+            "Last": last,
+            "Return %": (last / first - 1) * 100,
+            "Volatility % (ann.)": daily_returns.std() * np.sqrt(252) * 100,
+            f"MA{window}": closes.rolling(window, min_periods=1).mean().iloc[-1],
+        }
+    )
+
+
 @mcp.tool()
-def get_stock_plot(ticker: str, start_date: str, end_date: str) -> str:
+def get_stock_prices(tickers: list[str]) -> str:
     """
-    Generate a plot of closing prices for the given date range and save it as a PNG file.
-    Returns the filename if successful.
+    Retrieve the latest closing price for several tickers in one bulk download.
+    Returns one row per ticker with the price date and the change from the
+    previous close.
+    """
+    try:
+        logger.info(f"get_stock_prices invoked for tickers: {tickers}")
+        today = date.today()
+        histories = store.histories(
+            tickers, today - timedelta(days=10), today + timedelta(days=1)
+        )
+        closes = pd.DataFrame({t: h["Close"] for t, h in histories.items()})
+        if closes.dropna(how="all").empty:
+            return "No recent price data available for the given tickers."
+        last = closes.ffill().iloc[-1]
+        previous = closes.apply(
+            lambda column: column.dropna().iloc[-2] if column.count() > 1 else np.nan
+        )
+        last_date = closes.apply(lambda column: column.last_valid_index())
+        table = pd.DataFrame(
+            {
+                "Date": last_date.map(lambda ts: ts.date() if pd.notna(ts) else None),
+                "Close": last,
+                "Change %": (last / previous - 1) * 100,
+            }
+        )
+        result = table.to_string(float_format=lambda value: f"{value:.2f}")
+        logger.info(f"get_stock_prices result: {result}")
+        return result
+    except Exception as e:
+        logger.exception(f"Error retrieving prices for {tickers}")
+        return f"Error retrieving prices for {tickers}: {str(e)}"
+
+
+@mcp.tool()
+def get_stock_histories(
+    tickers: list[str],
+    start_date: str,
+    end_date: str,
+    include_prices: bool = True,
+    ma_window: int = 20,
+) -> str:
+    """
+    Retrieve closing prices for several tickers over the same date range in one
+    bulk download, as a table aligned on date with one column per ticker.
+    Also returns total return, annualized volatility and the latest
+    ma_window-day moving average per ticker. Set include_prices to False to
+    return only those metrics.
+    Dates should be strings in the format 'YYYY-MM-DD'.
+    """
+    try:
+        logger.info(
+            f"get_stock_histories invoked for tickers: {tickers} from {start_date} to {end_date}"
+        )
+        histories = store.histories(tickers, start_date, end_date)
+        closes = pd.DataFrame({t: h["Close"] for t, h in histories.items()})
+        closes = closes.dropna(how="all")
+        if closes.empty:
+            return "No historical data available for the given tickers in the given date range."
+        closes.index = closes.index.date
+
+        sections = []
+        if include_prices:
+            sections.append(closes.to_string(float_format=lambda value: f"{value:.2f}"))
+        sections.append(
+            compute_metrics(closes, ma_window).to_string(
+                float_format=lambda value: f"{value:.2f}"
+            )
+        )
+        result = "\n\n".join(sections)
+        logger.info(f"get_stock_histories result: {result}")
+        return result
+    except Exception as e:
+        logger.exception(f"Error retrieving historical data for {tickers}")
+        return f"Error retrieving historical data for {tickers}: {str(e)}"
+
+
+def downsample(series: pd.Series, max_points: int) -> pd.Series:
+    """Keep every n-th point (plus the last) so at most ~max_points are drawn."""
+    if len(series) <= max_points:
+        return series
+    step = -(-len(series) // max_points)
+    sampled = series.iloc[::step]
+    if sampled.index[-1] != series.index[-1]:
+        sampled = pd.concat([sampled, series.iloc[-1:]])
+    return sampled
+
+
+def render_plot(ticker: str, closes: pd.Series) -> bytes:
+    """
+    Render a closing-price chart to PNG bytes.
+    Uses a standalone Figure on the Agg canvas, so no pyplot global state is
+    shared between concurrent renders.
+    """
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(closes.index, closes.to_numpy(), label="Close Price")
+    ax.set_title(f"{ticker} Closing Prices")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Price (USD)")
+    ax.legend()
+    fig.autofmt_xdate()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def save_plot(ticker: str, png: bytes) -> Path:
+    """Write the PNG under a name derived from its content; identical plots share a file."""
+    PLOT_DIR.mkdir(parents=True, exist_ok=True)
+    path = PLOT_DIR / f"{ticker}_{hashlib.sha256(png).hexdigest()[:16]}.png"
+    if not path.exists():
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(png)
+        os.replace(tmp_path, path)
+    return path
+
+
+@mcp.tool()
+async def get_stock_plot(
+    ticker: str, start_date: str, end_date: str, save_to_file: bool = False
+):
+    """
+    Generate a plot of closing prices for the given date range.
+    Returns the PNG image, or with save_to_file=True saves it and returns the
+    file path. Long ranges are downsampled to keep rendering fast.
+    Dates should be strings in the format 'YYYY-MM-DD'.
     """
     try:
         logger.info(
             f"get_stock_plot invoked for ticker: {ticker} from {start_date} to {end_date}"
         )
-        t = yf.Ticker(ticker)
-        hist = t.history(start=start_date, end=end_date)
+        loop = asyncio.get_running_loop()
+        hist = await loop.run_in_executor(
+            None, store.history, ticker, start_date, end_date
+        )
         if not hist.empty:
-            plt.figure(figsize=(10, 6))
-            plt.plot(hist.index, hist["Close"], label="Close Price")
-            plt.title(f"{ticker.upper()} Closing Prices")
-            plt.xlabel("Date")
-            plt.ylabel("Price (USD)")
-            plt.legend()
-            file_name = f"{ticker.upper()}_plot.png"
-            plt.savefig(file_name)
-            plt.close()
-            result = f"Plot saved as {file_name}"
-            logger.info(result)
-            return result
+            closes = downsample(hist["Close"], PLOT_MAX_POINTS)
+            png = await loop.run_in_executor(
+                plot_executor, render_plot, ticker.upper(), closes
+            )
+            if save_to_file:
+                path = save_plot(ticker.upper(), png)
+                result = f"Plot saved as {path}"
+                logger.info(result)
+                return result
+            logger.info(f"get_stock_plot rendered {len(png)} bytes")
+            return Image(data=png, format="png")
         result = (
             f"No data to generate plot for {ticker.upper()} in the given date range."
         )
@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# stock_store.py
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional, Protocol, Union
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    ticker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume REAL,
+    PRIMARY KEY (ticker, date)
+);
+-- Half-open [start, end) date ranges already fetched from the data source
+CREATE TABLE IF NOT EXISTS coverage (
+    ticker TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_ticker ON coverage (ticker);
+"""
+
+DateLike = Union[str, date]
+
+
+def _to_date(value: DateLike) -> date:
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def _normalize_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Index by naive midnight timestamps and keep only the OHLCV columns."""
+    if frame is None or frame.empty:
+        return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([]))
+    index = pd.DatetimeIndex(pd.to_datetime(frame.index))
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    frame = frame.reindex(columns=OHLCV_COLUMNS).set_axis(index.normalize())
+    return frame[~frame.index.duplicated(keep="last")].sort_index()
+
+
+def _merge_ranges(ranges: list[tuple[date, date]]) -> list[tuple[date, date]]:
+    merged: list[tuple[date, date]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _missing_ranges(
+    start: date, end: date, covered: list[tuple[date, date]]
+) -> list[tuple[date, date]]:
+    """Sub-ranges of [start, end) not contained in the (merged) covered ranges."""
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def _covered_range(
+    start: date, end: date, fetched: pd.DataFrame
+) -> Optional[tuple[date, date]]:
+    """
+    The part of [start, end) that its own fetch ``fetched`` may record as
+    covered: the days up to the last returned bar, plus the weekend right after
+    it. An empty result can be a transient source failure (yfinance returns an
+    empty frame on errors), so it covers nothing.
+    """
+    if fetched.empty:
+        return None
+    horizon = fetched.index.max().date() + timedelta(days=1)
+    while horizon.weekday() >= 5:
+        horizon += timedelta(days=1)
+    return (start, min(end, horizon)) if start < horizon else None
+
+
+class DataSource(Protocol):
+    """
+    Sources may also define ``history_many(tickers, start, end)`` returning
+    ``{ticker: frame}`` to fetch several tickers in one request.
+    """
+
+    def history(self, ticker: str, start: date, end: date) -> pd.DataFrame:
+        """Daily OHLCV rows for ``ticker`` in [start, end), indexed by date."""
+        ...
+
+
+class YFinanceSource:
+    """Downloads daily history from Yahoo Finance."""
+
+    def history(self, ticker: str, start: date, end: date) -> pd.DataFrame:
+        import yfinance as yf
+
+        return yf.Ticker(ticker).history(
+            start=start.isoformat(), end=end.isoformat(), auto_adjust=True
+        )
+
+    def history_many(
+        self, tickers: list[str], start: date, end: date
+    ) -> dict[str, pd.DataFrame]:
+        import yfinance as yf
+
+        data = yf.download(
+            tickers,
+            start=start.isoformat(),
+            end=end.isoformat(),
+            auto_adjust=True,
+            group_by="ticker",
+            progress=False,
+            threads=True,
+        )
+        if not isinstance(data.columns, pd.MultiIndex):
+            return {tickers[0]: data}
+        present = set(data.columns.get_level_values(0))
+        # Rows are aligned across tickers, so drop days a ticker did not trade
+        return {
+            ticker: data[ticker].dropna(how="all")
+            for ticker in tickers
+            if ticker in present
+        }
+
+
+class CSVSource:
+    """
+    Serves history from ``{TICKER}.csv`` fixture files (as written by
+    ``DataFrame.to_csv`` on a yfinance history frame), for offline use.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self._frames: dict[str, pd.DataFrame] = {}
+
+    def _frame(self, ticker: str) -> pd.DataFrame:
+        if ticker not in self._frames:
+            path = self.directory / f"{ticker}.csv"
+            if path.exists():
+                frame = pd.read_csv(path, index_col=0)
+                # Keep each row's exchange-local date; converting to UTC first
+                # would move bars east of UTC to the previous day. Offsets can
+                # differ across DST changes, so each value is parsed on its own.
+                frame.index = pd.DatetimeIndex(
+                    [pd.Timestamp(value).tz_localize(None) for value in frame.index]
+                )
+            else:
+                frame = None
+            self._frames[ticker] = _normalize_frame(frame)
+        return self._frames[ticker]
+
+    def history(self, ticker: str, start: date, end: date) -> pd.DataFrame:
+        frame = self._frame(ticker)
+        return frame.loc[pd.Timestamp(start) : pd.Timestamp(end) - pd.Timedelta(days=1)]
+
+
+def create_data_source(name: str) -> DataSource:
+    """``"yfinance"`` or ``"csv:<fixture directory>"``."""
+    if name == "yfinance":
+        return YFinanceSource()
+    if name.startswith("csv:"):
+        return CSVSource(name[len("csv:") :])
+    raise ValueError(f"Unknown stock data source: {name}")
+
+
+# Local OHLCV cache keyed by (ticker, date); only uncovered date gaps are fetched
+class OHLCVStore:
+    """
+    Daily price history backed by SQLite, with per-ticker frames held in memory.
+
+    Closed days are fetched once. The trailing edge (today onwards) may still
+    change, so it is refetched when older than ``live_ttl`` seconds.
+    """
+
+    def __init__(
+        self,
+        source: DataSource,
+        db_path: Union[str, Path] = ":memory:",
+        live_ttl: float = 300,
+    ):
+        self.source = source
+        self.live_ttl = live_ttl
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._frames: dict[str, pd.DataFrame] = {}
+        self._live_refreshed: dict[str, float] = {}
+
+    def _coverage(self, ticker: str) -> list[tuple[date, date]]:
+        rows = self._conn.execute(
+            "SELECT start, end FROM coverage WHERE ticker = ?", (ticker,)
+        ).fetchall()
+        return _merge_ranges([(_to_date(s), _to_date(e)) for s, e in rows])
+
+    def _load_frame(self, ticker: str) -> pd.DataFrame:
+        if ticker not in self._frames:
+            frame = pd.read_sql_query(
+                "SELECT date, open, high, low, close, volume FROM prices "
+                "WHERE ticker = ? ORDER BY date",
+                self._conn,
+                params=(ticker,),
+                index_col="date",
+            )
+            frame.columns = OHLCV_COLUMNS
+            frame.index = pd.to_datetime(frame.index)
+            self._frames[ticker] = frame
+        return self._frames[ticker]
+
+    def _store(
+        self,
+        ticker: str,
+        fetched: pd.DataFrame,
+        covered: list[tuple[date, date]],
+    ):
+        """Persist fetched rows and newly covered ranges, and update the frame."""
+        if not fetched.empty:
+            records = [
+                (ticker, ts.date().isoformat(), *values)
+                for ts, values in zip(
+                    fetched.index,
+                    fetched[OHLCV_COLUMNS].astype(float).itertuples(index=False),
+                )
+            ]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)", records
+            )
+            existing = self._load_frame(ticker)
+            frame = pd.concat([existing, fetched]) if not existing.empty else fetched
+            self._frames[ticker] = frame[
+                ~frame.index.duplicated(keep="last")
+            ].sort_index()
+
+        if covered:
+            merged = _merge_ranges(self._coverage(ticker) + covered)
+            self._conn.execute("DELETE FROM coverage WHERE ticker = ?", (ticker,))
+            self._conn.executemany(
+                "INSERT INTO coverage VALUES (?, ?, ?)",
+                [(ticker, s.isoformat(), e.isoformat()) for s, e in merged],
+            )
+        self._conn.commit()
+
+    def _plan(
+        self, ticker: str, start: date, end: date
+    ) -> tuple[list[tuple[date, date]], Optional[tuple[date, date]]]:
+        """The closed-day gaps to fetch, and the live edge if it is stale."""
+        today = date.today()
+        closed_end = min(end, today)
+        gaps = (
+            _missing_ranges(start, closed_end, self._coverage(ticker))
+            if start < closed_end
+            else []
+        )
+
+        live = None
+        if end > today:
+            refreshed = self._live_refreshed.get(ticker)
+            if refreshed is None or time.monotonic() - refreshed > self.live_ttl:
+                live = (max(start, today), end)
+        return gaps, live
+
+    def _fill(self, ticker: str, start: date, end: date):
+        gaps, live = self._plan(ticker, start, end)
+        if not gaps and live is None:
+            return
+
+        fetched, covered = [], []
+        for i, (gap_start, gap_end) in enumerate(gaps + ([live] if live else [])):
+            logger.info(f"Fetching {ticker} history from {gap_start} to {gap_end}")
+            frame = _normalize_frame(self.source.history(ticker, gap_start, gap_end))
+            if frame.empty:
+                continue
+            fetched.append(frame)
+            # Only closed days are recorded as covered; the live edge is time-bound
+            if i < len(gaps):
+                covered.append(_covered_range(gap_start, gap_end, frame))
+        self._store(ticker, _normalize_frame(pd.concat(fetched) if fetched else None), covered)
+        if live is not None:
+            self._live_refreshed[ticker] = time.monotonic()
+
+    def history(self, ticker: str, start: DateLike, end: DateLike) -> pd.DataFrame:
+        """Daily OHLCV rows for [start, end), fetching only what is missing."""
+        ticker = ticker.upper()
+        start, end = _to_date(start), _to_date(end)
+        with self._lock:
+            self._fill(ticker, start, end)
+            frame = self._load_frame(ticker)
+        return frame.loc[pd.Timestamp(start) : pd.Timestamp(end) - pd.Timedelta(days=1)]
+
+    def _fill_many(self, tickers: list[str], start: date, end: date):
+        """Fill several tickers with a single bulk request over their joint gaps."""
+        pending = {}
+        for ticker in tickers:
+            gaps, live = self._plan(ticker, start, end)
+            if gaps or live:
+                pending[ticker] = gaps + ([live] if live else [])
+        if not pending:
+            return
+
+        fetch_start = min(r[0] for ranges in pending.values() for r in ranges)
+        fetch_end = max(r[1] for ranges in pending.values() for r in ranges)
+        logger.info(
+            f"Fetching {len(pending)} tickers from {fetch_start} to {fetch_end}"
+        )
+        history_many = getattr(self.source, "history_many", None)
+        if history_many is not None:
+            frames = history_many(list(pending), fetch_start, fetch_end)
+        else:
+            frames = {
+                ticker: self.source.history(ticker, fetch_start, fetch_end)
+                for ticker in pending
+            }
+
+        today = date.today()
+        closed_end = min(fetch_end, today)
+        for ticker in pending:
+            fetched = _normalize_frame(frames.get(ticker))
+            covered = (
+                _covered_range(fetch_start, closed_end, fetched)
+                if fetch_start < closed_end
+                else None
+            )
+            self._store(ticker, fetched, [covered] if covered else [])
+            if fetch_end > today:
+                self._live_refreshed[ticker] = time.monotonic()
+
+    def histories(
+        self, tickers: list[str], start: DateLike, end: DateLike
+    ) -> dict[str, pd.DataFrame]:
+        """Like ``history`` for several tickers, fetched in one bulk request."""
+        tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+        start, end = _to_date(start), _to_date(end)
+        lo, hi = pd.Timestamp(start), pd.Timestamp(end) - pd.Timedelta(days=1)
+        with self._lock:
+            self._fill_many(tickers, start, end)
+            return {ticker: self._load_frame(ticker).loc[lo:hi] for ticker in tickers}
+
+    def latest(self, ticker: str, lookback_days: int = 10) -> Optional[pd.Series]:
+        """The most recent daily row, or None if there is no recent data."""
+        today = date.today()
+        frame = self.history(
+            ticker, today - timedelta(days=lookback_days), today + timedelta(days=1)
+        )
+        return None if frame.empty else frame.iloc[-1]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_store_from_env() -> OHLCVStore:
+    return OHLCVStore(
+        create_data_source(os.getenv("STOCK_DATA_SOURCE", "yfinance")),
+        db_path=os.getenv(
+            "STOCK_STORE_PATH", str(Path.home() / ".cache" / "stocks" / "ohlcv.db")
+        ),
+        live_ttl=float(os.getenv("STOCK_LIVE_TTL_SECONDS", "300")),
+    )
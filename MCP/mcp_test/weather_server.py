@@ -1,35 +1,137 @@
+import asyncio
 import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Optional, Protocol
+from urllib.parse import quote
 
 import dotenv
-import requests
+import httpx
 from mcp.server.fastmcp import FastMCP
 
 dotenv.load_dotenv()  # Load environment variables from .env file mainly for proxy settings to be able to ping the Weather api
 
 logger = logging.getLogger(__name__)
 
+# "wttr" queries wttr.in; "stub" answers locally without network access (for tests)
+WEATHER_BACKEND = os.getenv("WEATHER_BACKEND", "wttr")
+WTTR_BASE_URL = os.getenv("WTTR_BASE_URL", "https://wttr.in")
+# Per-request timeout and how long a city's report is reused, in seconds
+WEATHER_HTTP_TIMEOUT = float(os.getenv("WEATHER_HTTP_TIMEOUT_SECONDS", "10"))
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL_SECONDS", "600"))
+# Cities kept in the report cache; the least recently used are evicted first
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "256"))
+# Simulated latency of the stub backend, to exercise concurrent calls
+WEATHER_STUB_DELAY = float(os.getenv("WEATHER_STUB_DELAY_SECONDS", "0"))
+
+
+class WeatherBackend(Protocol):
+    async def fetch(self, city: str) -> str: ...
+
+    async def close(self) -> None: ...
+
+
+class WttrBackend:
+    """
+    Fetches one-line reports from wttr.in over a pooled async HTTP client.
+    Proxy settings are picked up from HTTP_PROXY/HTTPS_PROXY/NO_PROXY.
+    """
+
+    def __init__(self, base_url: str = WTTR_BASE_URL, timeout: float = WEATHER_HTTP_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the server's running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+        return self._client
+
+    async def fetch(self, city: str) -> str:
+        endpoint = f"{self.base_url}/{quote(city)}"
+        response = await self._get_client().get(endpoint, params={"format": "3"})
+        response.raise_for_status()  # Raise exception for non-200 status codes
+        return response.text.strip()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class StubBackend:
+    """Returns a fixed report for any city; no network access."""
+
+    def __init__(self, delay: float = WEATHER_STUB_DELAY):
+        self.delay = delay
+
+    async def fetch(self, city: str) -> str:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return f"{city}: ☀️ +20°C"
+
+    async def close(self) -> None:
+        pass
+
+
+def create_backend(name: str = WEATHER_BACKEND) -> WeatherBackend:
+    if name == "stub":
+        return StubBackend()
+    if name == "wttr":
+        return WttrBackend()
+    raise ValueError(f"Unknown weather backend: {name}")
+
+
+backend: WeatherBackend = create_backend()
+
+# normalized city -> (expires_at, report), in least recently used order
+_weather_cache: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    try:
+        yield
+    finally:
+        await backend.close()
+
+
 # Create the MCP server instance with the name "Weather"
-mcp = FastMCP("Weather")
+mcp = FastMCP("Weather", lifespan=lifespan)
 
 
 @mcp.tool()
-def get_current_weather(city: str) -> str:
+async def get_current_weather(city: str) -> str:
     """
     Get current weather for a given city.
     For a real implementation, we use an API call to wttr.in.
-    If needed, this can be replaced with a dummy function.
+    Set WEATHER_BACKEND=stub to replace it with a dummy report.
     """
-    print("IN WEATHER SERVER")
     logger.info(f"Weather tool 'get_current_weather' invoked with city: {city}")
+    key = " ".join(city.lower().split())
+    cached = _weather_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        _weather_cache.move_to_end(key)
+        logger.info(f"Weather tool 'get_current_weather' cache hit for: {city}")
+        return cached[1]
+
     try:
-        # Using wttr.in to get a brief weather report; you can adjust formatting as needed.
-        endpoint = f"https://wttr.in/{city}?format=3"
-        response = requests.get(endpoint)
-        response.raise_for_status()  # Raise exception for non-200 status codes
-        result = response.text
+        result = await backend.fetch(city)
+        # Only successful reports are cached, so errors are retried on the next call
+        _weather_cache[key] = (time.monotonic() + WEATHER_CACHE_TTL, result)
+        _weather_cache.move_to_end(key)
+        while len(_weather_cache) > WEATHER_CACHE_MAX_ENTRIES:
+            _weather_cache.popitem(last=False)
         logger.info(f"Weather tool 'get_current_weather' result: {result}")
         return result
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         error_msg = f"Error retrieving weather data: {e}"
         logger.error(error_msg)
         return error_msg
@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Every field any tool reads, so the mirror can answer all of them
+MIRROR_FIELDS = (
+    "sys_id,number,short_description,text,author,author.email,sys_updated_on,"
+    "workflow_state,valid_to,valid_from,kb_knowledge_base"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    sys_id TEXT PRIMARY KEY,
+    number TEXT,
+    short_description TEXT,
+    text TEXT,
+    author_email TEXT,
+    workflow_state TEXT,
+    workflow_state_display TEXT,
+    sys_updated_on TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_number ON articles (number);
+CREATE INDEX IF NOT EXISTS articles_author_email ON articles (author_email);
+CREATE INDEX IF NOT EXISTS articles_workflow_state ON articles (workflow_state);
+CREATE INDEX IF NOT EXISTS articles_sys_updated_on ON articles (sys_updated_on);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5 (
+    short_description, text, content='articles', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, short_description, text)
+    VALUES (new.rowid, new.short_description, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, short_description, text)
+    VALUES ('delete', old.rowid, old.short_description, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, short_description, text)
+    VALUES ('delete', old.rowid, old.short_description, old.text);
+    INSERT INTO articles_fts (rowid, short_description, text)
+    VALUES (new.rowid, new.short_description, new.text);
+END;
+
+CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+GROUP_BY_COLUMNS = {
+    "workflow_state": "workflow_state_display",
+    "author.email": "author_email",
+}
+
+
+def _display(record: dict[str, Any], field: str) -> Optional[str]:
+    value = record.get(field)
+    return value.get("display_value") if isinstance(value, dict) else value
+
+
+def _raw(record: dict[str, Any], field: str) -> Optional[str]:
+    value = record.get(field)
+    return value.get("value") if isinstance(value, dict) else value
+
+
+def _project(record: dict[str, Any], fields: Optional[str]) -> dict[str, Any]:
+    if not fields:
+        return record
+    return {field: record[field] for field in fields.split(",") if field in record}
+
+
+# Local SQLite/FTS5 copy of kb_knowledge, kept current by incremental sync
+class KnowledgeMirror:
+    """
+    Mirrors ``kb_knowledge`` into SQLite so the read-only tools answer locally.
+
+    Records are stored as returned with ``sysparm_display_value=all`` plus a few
+    indexed columns and an FTS5 index over title and body. ``sync`` only pulls
+    records with ``sys_updated_on`` after the stored watermark. Deleted articles
+    are not detected; they remain until the mirror file is rebuilt.
+    """
+
+    def __init__(self, db_path: str, sync_interval_seconds: float = 300.0):
+        self.sync_interval_seconds = sync_interval_seconds
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self.last_sync = 0.0
+        self._sync_task: Optional[asyncio.Task] = None
+
+    @property
+    def watermark(self) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT value FROM sync_state WHERE key = 'watermark'"
+        ).fetchone()
+        return row[0] if row else None
+
+    @property
+    def ready(self) -> bool:
+        """True once a full initial sync has completed."""
+        row = self.conn.execute(
+            "SELECT value FROM sync_state WHERE key = 'initial_sync_done'"
+        ).fetchone()
+        return row is not None
+
+    def refresh_in_background(self, client) -> None:
+        """Start a sync if the last one is older than the interval; never blocks the caller."""
+        if self._sync_task is not None and not self._sync_task.done():
+            return
+        if time.monotonic() - self.last_sync < self.sync_interval_seconds:
+            return
+        self._sync_task = asyncio.create_task(self.sync(client))
+
+    async def sync(self, client) -> int:
+        """Pull articles changed since the watermark and upsert them. Returns the count."""
+        watermark = self.watermark
+        query = "ORDERBYsys_updated_on"
+        if watermark:
+            # >= re-reads the boundary second so records sharing it are not missed
+            query = f"sys_updated_on>={watermark}^{query}"
+        params = {
+            "sysparm_display_value": "all",
+            "sysparm_fields": MIRROR_FIELDS,
+            "sysparm_query": query,
+        }
+
+        synced = 0
+        try:
+            async for record in client.iter_records(
+                "/api/now/table/kb_knowledge", params=params, cache=False
+            ):
+                # Records arrive ordered by sys_updated_on, so the last one is the newest
+                watermark = self._upsert(record) or watermark
+                synced += 1
+                # Commit in chunks so an interrupted sync keeps its progress
+                if synced % 500 == 0:
+                    self._save_watermark(watermark)
+                    self.conn.commit()
+            self._save_watermark(watermark)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('initial_sync_done', '1')"
+            )
+            self.conn.commit()
+            self.last_sync = time.monotonic()
+            logger.info(f"Knowledge mirror synced {synced} article(s)")
+        except Exception as e:
+            self._save_watermark(watermark)
+            self.conn.commit()
+            logger.error(f"Knowledge mirror sync failed after {synced} article(s): {e}")
+        return synced
+
+    def _save_watermark(self, watermark: Optional[str]) -> None:
+        if watermark:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('watermark', ?)",
+                (watermark,),
+            )
+
+    def _upsert(self, record: dict[str, Any]) -> Optional[str]:
+        """Insert or update one article and return its sys_updated_on value."""
+        updated_on = _raw(record, "sys_updated_on")
+        self.conn.execute(
+            """
+            INSERT INTO articles (sys_id, number, short_description, text, author_email,
+                                  workflow_state, workflow_state_display, sys_updated_on, record)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (sys_id) DO UPDATE SET
+                number = excluded.number,
+                short_description = excluded.short_description,
+                text = excluded.text,
+                author_email = excluded.author_email,
+                workflow_state = excluded.workflow_state,
+                workflow_state_display = excluded.workflow_state_display,
+                sys_updated_on = excluded.sys_updated_on,
+                record = excluded.record
+            """,
+            (
+                _raw(record, "sys_id"),
+                _display(record, "number"),
+                _display(record, "short_description"),
+                _display(record, "text"),
+                _display(record, "author.email"),
+                _raw(record, "workflow_state"),
+                _display(record, "workflow_state"),
+                updated_on,
+                json.dumps(record),
+            ),
+        )
+        return updated_on
+
+    def search(
+        self,
+        query_text: Optional[str] = None,
+        article_number: Optional[str] = None,
+        fields: Optional[str] = None,
+        limit: int = 10,
+    ) -> list[dict[str, Any]]:
+        """
+        Full-text search over title and body, optionally restricted to one
+        article number. Returns the ``limit`` most recently updated matches.
+        """
+        sql = "SELECT a.record FROM articles AS a"
+        conditions, args = [], []
+        if query_text:
+            sql += " JOIN articles_fts AS f ON f.rowid = a.rowid"
+            conditions.append("articles_fts MATCH ?")
+            # Quote as a phrase so user text is never parsed as FTS syntax
+            args.append('"' + query_text.replace('"', '""') + '"')
+        if article_number:
+            conditions.append("a.number = ?")
+            args.append(article_number)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY a.sys_updated_on DESC LIMIT ?"
+        args.append(limit)
+        return [_project(json.loads(row[0]), fields) for row in self.conn.execute(sql, args)]
+
+    def summarize(
+        self,
+        author_email: Optional[str] = None,
+        state: Optional[str] = None,
+        updated_from: Optional[str] = None,
+        updated_to: Optional[str] = None,
+        group_by: Optional[str] = None,
+        limit: int = 10,
+    ) -> tuple[int, dict[str, int], list[dict[str, Any]]]:
+        """Return (total, counts per group, first ``limit`` records) for the given filters."""
+        conditions, args = [], []
+        if author_email:
+            conditions.append("author_email = ?")
+            args.append(author_email)
+        if state:
+            conditions.append(
+                "(lower(workflow_state) = lower(?) OR lower(workflow_state_display) = lower(?))"
+            )
+            args += [state, state]
+        if updated_from:
+            conditions.append("sys_updated_on >= ?")
+            args.append(updated_from)
+        if updated_to:
+            conditions.append("sys_updated_on < ?")
+            args.append(updated_to)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+        total = self.conn.execute(f"SELECT count(*) FROM articles{where}", args).fetchone()[0]
+        groups = {}
+        if group_by:
+            column = GROUP_BY_COLUMNS[group_by]
+            for label, count in self.conn.execute(
+                f"SELECT {column}, count(*) FROM articles{where} GROUP BY {column}", args
+            ):
+                groups[label or "Unknown"] = count
+        records = [
+            json.loads(row[0])
+            for row in self.conn.execute(
+                f"SELECT record FROM articles{where} ORDER BY number LIMIT ?", args + [limit]
+            )
+        ]
+        return total, groups, records
@@ -2,11 +2,14 @@ import asyncio
 import json
 import logging
 import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional
 
 import httpx
 from dotenv import load_dotenv
+from kb_mirror import KnowledgeMirror
 from mcp.server.fastmcp import FastMCP
 from pydantic import BaseModel, Field
 
@@ -36,35 +39,319 @@ class QueryOptions(BaseModel):
     offset: int = Field(0, description="Records to skip", ge=0)
 
 
+# Table API path for knowledge articles
+ARTICLES_PATH = "/api/now/table/kb_knowledge"
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+# Cached GET response with the validators needed to revalidate it cheaply
+class CacheEntry:
+    def __init__(self, data: dict[str, Any], etag: Optional[str], total_count: Optional[int]):
+        self.data = data
+        self.etag = etag
+        # X-Total-Count of the query, to notice records that left its result set
+        self.total_count = total_count
+        self.stored_at = time.monotonic()
+        # Newest sys_updated_on in the cached records, used as a change watermark
+        records = data.get("result")
+        records = records if isinstance(records, list) else []
+        self.watermark = max(
+            (
+                _field_value(record["sys_updated_on"])
+                for record in records
+                if record.get("sys_updated_on")
+            ),
+            default=None,
+        )
+
+
+def _field_value(field: Any) -> Any:
+    """Return the raw value of a field fetched with or without sysparm_display_value=all."""
+    return field.get("value") if isinstance(field, dict) else field
+
+
+def _total_count(response: httpx.Response) -> Optional[int]:
+    """Number of records matching a Table API query, from the X-Total-Count header."""
+    total = response.headers.get("X-Total-Count", "")
+    return int(total) if total.isdigit() else None
+
+
+# LRU + TTL cache of GET responses with single-flight request coalescing
+class ResponseCache:
+    def __init__(self, ttl_seconds: float = 300.0, max_entries: int = 512):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple, CacheEntry] = OrderedDict()
+        self.inflight: dict[tuple, asyncio.Task] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "revalidated": 0}
+
+    @staticmethod
+    def make_key(method: str, path: str, params: Optional[dict[str, Any]]) -> tuple:
+        return (method, path, tuple(sorted((k, str(v)) for k, v in (params or {}).items())))
+
+    def get(self, key: tuple) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.monotonic() - entry.stored_at <= self.ttl_seconds
+
+    def put(self, key: tuple, entry: CacheEntry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
 # ServiceNow client for interacting with the API
 class ServiceNowClient:
-    def __init__(self, instance_url: str, auth: BasicAuth):
+    """
+    Async ServiceNow REST client over one pooled keep-alive ``httpx.AsyncClient``.
+
+    429/5xx responses are retried with exponential backoff (honouring
+    ``Retry-After``). The method names mirror the synchronous client in
+    ``database_assistant/tools/servicenow.py``.
+    """
+
+    def __init__(
+        self,
+        instance_url: str,
+        auth: BasicAuth,
+        timeout: float = 30.0,
+        page_size: int = 100,
+        max_retries: int = 3,
+        max_connections: int = 10,
+        cache: Optional[ResponseCache] = None,
+    ):
         self.instance_url = instance_url.rstrip("/")
         self.auth = auth
-        self.client = httpx.AsyncClient(verify=False)
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.cache = cache
+        self.client = httpx.AsyncClient(
+            verify=False,
+            auth=auth.get_auth(),
+            headers={"Accept": "application/json"},
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
 
     async def close(self):
         await self.client.aclose()
 
     async def request(
-        self, method: str, path: str, params: Optional[dict[str, Any]] = None
+        self,
+        method: str,
+        path: str,
+        params: Optional[dict[str, Any]] = None,
+        cache: bool = True,
+    ) -> dict[str, Any]:
+        if self.cache is None or method != "GET" or not cache:
+            return (await self._send(method, path, params)).json()
+
+        key = self.cache.make_key(method, path, params)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache.stats["hits"] += 1
+            return entry.data
+
+        # Share one HTTP call between concurrent identical requests
+        task = self.cache.inflight.get(key)
+        if task is not None:
+            self.cache.stats["coalesced"] += 1
+        else:
+            task = asyncio.create_task(self._fetch_or_revalidate(key, path, params, entry))
+            self.cache.inflight[key] = task
+            task.add_done_callback(lambda _: self.cache.inflight.pop(key, None))
+        # Shielded, so a cancelled caller does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def _fetch_or_revalidate(
+        self,
+        key: tuple,
+        path: str,
+        params: Optional[dict[str, Any]],
+        entry: Optional[CacheEntry],
     ) -> dict[str, Any]:
+        """
+        Revalidate a stale entry via ETag, or via sys_updated_on and the record
+        count, else fetch it again.
+        """
+        if entry is not None:
+            if entry.etag:
+                response = await self._send(
+                    "GET", path, params, headers={"If-None-Match": entry.etag}
+                )
+                if response.status_code == 304:
+                    return self._mark_revalidated(entry)
+                return self._store(key, response)
+
+            query = (params or {}).get("sysparm_query")
+            if entry.watermark and query and entry.total_count is not None:
+                # Cheap probes, sent together: has anything matching the query
+                # changed since we cached it, and does it still match as many
+                # records? The count catches deletions and records updated so
+                # they no longer match, which the watermark alone cannot see.
+                changed, count = await asyncio.gather(
+                    self._send(
+                        "GET",
+                        path,
+                        {
+                            "sysparm_query": f"{query}^sys_updated_on>{entry.watermark}",
+                            "sysparm_fields": "sys_id",
+                            "sysparm_limit": 1,
+                        },
+                    ),
+                    self._send(
+                        "GET",
+                        path,
+                        {"sysparm_query": query, "sysparm_fields": "sys_id", "sysparm_limit": 1},
+                    ),
+                )
+                if not changed.json().get("result") and (
+                    _total_count(count) == entry.total_count
+                ):
+                    return self._mark_revalidated(entry)
+
+        self.cache.stats["misses"] += 1
+        return self._store(key, await self._send("GET", path, params))
+
+    def _mark_revalidated(self, entry: CacheEntry) -> dict[str, Any]:
+        self.cache.stats["revalidated"] += 1
+        entry.stored_at = time.monotonic()
+        return entry.data
+
+    def _store(self, key: tuple, response: httpx.Response) -> dict[str, Any]:
+        data = response.json()
+        self.cache.put(
+            key, CacheEntry(data, response.headers.get("ETag"), _total_count(response))
+        )
+        return data
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        params: Optional[dict[str, Any]] = None,
+        headers: Optional[dict[str, str]] = None,
+    ) -> httpx.Response:
         url = f"{self.instance_url}{path}"
-        headers = {"Accept": "application/json"}
-        auth_tuple = self.auth.get_auth()
 
         logger.info(f"Making request to {url} with params {params}")
 
-        try:
+        for attempt in range(self.max_retries + 1):
             response = await self.client.request(
-                method=method, url=url, params=params, headers=headers, auth=auth_tuple
+                method=method, url=url, params=params, headers=headers
             )
             logger.info(f"Response status: {response.status_code}")
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            logger.error(f"ServiceNow API error: {e.response.text}")
-            raise
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else 0.5 * 2**attempt
+                logger.warning(f"Retrying {url} in {delay}s after status {response.status_code}")
+                await asyncio.sleep(delay)
+                continue
+            if response.status_code == 304:
+                return response
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                logger.error(f"ServiceNow API error: {e.response.text}")
+                raise
+            return response
+
+    async def iter_records(
+        self,
+        path: str,
+        params: Optional[dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        cache: bool = True,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield records page by page using sysparm_limit/sysparm_offset, up to ``limit``."""
+        params = dict(params or {})
+        offset = int(params.pop("sysparm_offset", 0))
+        returned = 0
+        while limit is None or returned < limit:
+            page_size = self.page_size if limit is None else min(self.page_size, limit - returned)
+            result = await self.request(
+                "GET",
+                path,
+                params={**params, "sysparm_limit": page_size, "sysparm_offset": offset},
+                cache=cache,
+            )
+            page = result.get("result", [])
+            for record in page:
+                yield record
+            returned += len(page)
+            offset += len(page)
+            if len(page) < page_size:
+                return
+
+    async def fetch_records(
+        self,
+        path: str,
+        params: Optional[dict[str, Any]],
+        total: int,
+        limit: Optional[int] = None,
+        concurrency: int = 4,
+    ) -> list[dict[str, Any]]:
+        """
+        Fetch up to ``limit`` of ``total`` matching records, requesting pages concurrently.
+
+        ``total`` normally comes from ``aggregate``; at most ``concurrency`` page
+        requests are in flight at once and records keep their server order.
+        """
+        wanted = total if limit is None else min(total, limit)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_page(offset: int) -> list[dict[str, Any]]:
+            page_params = {
+                **(params or {}),
+                "sysparm_limit": min(self.page_size, wanted - offset),
+                "sysparm_offset": offset,
+            }
+            async with semaphore:
+                result = await self.request("GET", path, params=page_params)
+            return result.get("result", [])
+
+        pages = await asyncio.gather(
+            *(fetch_page(offset) for offset in range(0, wanted, self.page_size))
+        )
+        return [record for page in pages for record in page]
+
+    async def aggregate(
+        self, table: str, query: Optional[str] = None, group_by: Optional[str] = None
+    ) -> tuple[int, dict[str, int]]:
+        """
+        Count records with the Aggregate API instead of downloading them.
+
+        Returns the total count and, when ``group_by`` is given, the count per
+        group keyed by the group's display value.
+        """
+        params = {"sysparm_count": "true", "sysparm_display_value": "true"}
+        if query:
+            params["sysparm_query"] = query
+        if group_by:
+            params["sysparm_group_by"] = group_by
+        result = (await self.request("GET", f"/api/now/stats/{table}", params=params)).get(
+            "result", {}
+        )
+
+        if not group_by:
+            return int(result.get("stats", {}).get("count", 0)), {}
+
+        groups = {}
+        for group in result:
+            fields = group.get("groupby_fields") or [{}]
+            label = fields[0].get("display_value") or fields[0].get("value") or "Unknown"
+            groups[label] = groups.get(label, 0) + int(group.get("stats", {}).get("count", 0))
+        return sum(groups.values()), groups
 
     async def get_knowledge_article(self, sys_id: str, fields: str) -> dict[str, Any]:
         params = {"sysparm_fields": fields}
@@ -73,14 +360,30 @@ class ServiceNowClient:
         )
 
     async def list_knowledge_articles(self, params: dict[str, Any]) -> dict[str, Any]:
-        return await self.request("GET", "/api/now/table/kb_knowledge", params=params)
+        return await self.request("GET", ARTICLES_PATH, params=params)
 
 
 # MCP server for ServiceNow knowledge articles
 class ServiceNowKAMCP:
-    def __init__(self, instance_url: str, username: str, password: str):
+    def __init__(
+        self,
+        instance_url: str,
+        username: str,
+        password: str,
+        cache_ttl_seconds: float = 300.0,
+        cache_max_entries: int = 512,
+        mirror_path: Optional[str] = None,
+        mirror_sync_interval_seconds: float = 300.0,
+    ):
         auth = BasicAuth(username, password)
-        self.client = ServiceNowClient(instance_url, auth)
+        cache = ResponseCache(ttl_seconds=cache_ttl_seconds, max_entries=cache_max_entries)
+        self.client = ServiceNowClient(instance_url, auth, cache=cache)
+        # Optional local copy of kb_knowledge for the read-only tools
+        self.mirror = (
+            KnowledgeMirror(mirror_path, sync_interval_seconds=mirror_sync_interval_seconds)
+            if mirror_path
+            else None
+        )
         self.mcp = FastMCP("ServiceNow Knowledge Articles MCP")
 
         # Register tools
@@ -183,6 +486,50 @@ class ServiceNowKAMCP:
             logger.error(f"Error in 'get_knowledge_article_tool': {e}")
             raise
 
+    def local_mirror(self) -> Optional[KnowledgeMirror]:
+        """Return the mirror if it can answer queries, starting a background sync when due."""
+        if self.mirror is None:
+            return None
+        self.mirror.refresh_in_background(self.client)
+        return self.mirror if self.mirror.ready else None
+
+    async def summarize_articles(
+        self,
+        query: str,
+        fields: str,
+        group_by: Optional[str] = None,
+        limit: int = 10,
+        **mirror_filters: Any,
+    ) -> tuple[int, dict[str, int], list[dict[str, Any]]]:
+        """
+        Return (total, counts per group, first ``limit`` articles) for a query.
+
+        Answered from the local mirror when it has matches, otherwise from the
+        Aggregate API plus a bounded paginated listing.
+        """
+        mirror = self.local_mirror()
+        if mirror is not None:
+            total, groups, articles = mirror.summarize(
+                group_by=group_by, limit=limit, **mirror_filters
+            )
+            if total:
+                return total, groups, articles
+
+        total, groups = await self.client.aggregate(
+            "kb_knowledge", query=query, group_by=group_by
+        )
+        articles = []
+        if total:
+            params = {
+                "sysparm_display_value": "all",
+                "sysparm_fields": fields,
+                "sysparm_query": query,
+            }
+            articles = await self.client.fetch_records(
+                ARTICLES_PATH, params, total=total, limit=limit
+            )
+        return total, groups, articles
+
     # Add these new tool handlers to the ServiceNowKAMCP class
 
     async def count_articles_by_author_tool(
@@ -196,25 +543,14 @@ class ServiceNowKAMCP:
             if not author_email:
                 return json.dumps({"error": "Author email is required"}, indent=2)
 
-            params = {
-                "sysparm_display_value": "all",
-                "sysparm_fields": "number,short_description,author.email,workflow_state",
-                "sysparm_query": f"author.email={author_email}",
-            }
-
-            result = await self.client.list_knowledge_articles(params)
-
-            if result.get("result"):
-                article_count = len(result["result"])
-
-                # Count articles by state
-                state_count = {}
-                for article in result["result"]:
-                    state = article.get("workflow_state", {}).get(
-                        "display_value", "Unknown"
-                    )
-                    state_count[state] = state_count.get(state, 0) + 1
+            article_count, state_count, articles = await self.summarize_articles(
+                query=f"author.email={author_email}",
+                fields="number,short_description,author.email,workflow_state",
+                group_by="workflow_state",
+                author_email=author_email,
+            )
 
+            if article_count:
                 response = {
                     "author_email": author_email,
                     "total_articles": article_count,
@@ -231,9 +567,7 @@ class ServiceNowKAMCP:
                                 "display_value", "Unknown"
                             ),
                         }
-                        for article in result["result"][
-                            :10
-                        ]  # Limit to first 10 for readability
+                        for article in articles
                     ],
                 }
 
@@ -253,27 +587,14 @@ class ServiceNowKAMCP:
         """Get knowledge articles filtered by workflow state."""
         logger.info(f"Tool 'articles_by_state' invoked with state={state}")
         try:
-            params = {
-                "sysparm_display_value": "all",
-                "sysparm_fields": "sys_id,number,short_description,author,author.email,sys_updated_on,workflow_state",
-                "sysparm_query": f"workflow_state={state}",
-            }
-
-            result = await self.client.list_knowledge_articles(params)
-
-            if result.get("result"):
-                article_count = len(result["result"])
-
-                # Group by author
-                authors = {}
-                for article in result["result"]:
-                    author_email = article.get("author.email", {}).get(
-                        "display_value", "Unknown"
-                    )
-                    if author_email not in authors:
-                        authors[author_email] = 0
-                    authors[author_email] += 1
+            article_count, authors, articles = await self.summarize_articles(
+                query=f"workflow_state={state}",
+                fields="sys_id,number,short_description,author,author.email,sys_updated_on,workflow_state",
+                group_by="author.email",
+                state=state,
+            )
 
+            if article_count:
                 response = {
                     "state": state,
                     "total_articles": article_count,
@@ -296,9 +617,7 @@ class ServiceNowKAMCP:
                                 "display_value", "Unknown"
                             ),
                         }
-                        for article in result["result"][
-                            :10
-                        ]  # Limit to first 10 for readability
+                        for article in articles
                     ],
                 }
 
@@ -329,17 +648,14 @@ class ServiceNowKAMCP:
                 )
 
             # Query for articles updated on the specific date
-            params = {
-                "sysparm_display_value": "all",
-                "sysparm_fields": "sys_id,number,short_description,author,author.email,sys_updated_on,workflow_state",
-                "sysparm_query": f"sys_updated_on>={date_str}^sys_updated_on<{next_date}",
-            }
-
-            result = await self.client.list_knowledge_articles(params)
-
-            if result.get("result"):
-                article_count = len(result["result"])
+            article_count, _, articles = await self.summarize_articles(
+                query=f"sys_updated_on>={date_str}^sys_updated_on<{next_date}",
+                fields="sys_id,number,short_description,author,author.email,sys_updated_on,workflow_state",
+                updated_from=date_str,
+                updated_to=next_date,
+            )
 
+            if article_count:
                 response = {
                     "update_date": date,
                     "total_articles": article_count,
@@ -364,9 +680,7 @@ class ServiceNowKAMCP:
                                 "display_value", "Unknown"
                             ),
                         }
-                        for article in result["result"][
-                            :10
-                        ]  # Limit to first 10 for readability
+                        for article in articles
                     ],
                 }
 
@@ -406,15 +720,17 @@ class ServiceNowKAMCP:
         return params
 
     async def search_knowledge_articles_tool(
-        self, query_text: str = None, article_number: str = None
+        self, query_text: str = None, article_number: str = None, limit: int = 10
     ) -> str:
         logger.info(
-            f"Tool 'search_knowledge_articles' invoked with query={query_text}, article_number={article_number}"
+            f"Tool 'search_knowledge_articles' invoked with query={query_text}, article_number={article_number}, limit={limit}"
         )
         try:
+            options = QueryOptions(limit=limit)
             params = {
                 "sysparm_display_value": "all",
                 "sysparm_fields": "sys_id,number,short_description,author,author.email,sys_updated_on",
+                "sysparm_limit": options.limit,
             }
 
             query_parts = []
@@ -428,6 +744,18 @@ class ServiceNowKAMCP:
                     f"short_descriptionLIKE{query_text}^ORtextLIKE{query_text}"
                 )
 
+            mirror = self.local_mirror()
+            if mirror is not None:
+                records = mirror.search(
+                    query_text,
+                    article_number,
+                    fields=params["sysparm_fields"],
+                    limit=options.limit,
+                )
+                if records:
+                    logger.info("Tool 'search_knowledge_articles' answered from local mirror.")
+                    return json.dumps({"result": records}, indent=2)
+
             if query_parts:
                 params["sysparm_query"] = "^".join(query_parts)
 
@@ -451,7 +779,15 @@ def main():
             "Missing required environment variables: SERVICENOW_INSTANCE_URL, SERVICENOW_USERNAME, SERVICENOW_PASSWORD"
         )
 
-    server = ServiceNowKAMCP(instance_url, username, password)
+    server = ServiceNowKAMCP(
+        instance_url,
+        username,
+        password,
+        cache_ttl_seconds=float(os.getenv("SNOW_CACHE_TTL_SECONDS", "300")),
+        cache_max_entries=int(os.getenv("SNOW_CACHE_MAX_ENTRIES", "512")),
+        mirror_path=os.getenv("SNOW_MIRROR_PATH"),
+        mirror_sync_interval_seconds=float(os.getenv("SNOW_MIRROR_SYNC_INTERVAL_SECONDS", "300")),
+    )
     server.run(transport="stdio")
 
 
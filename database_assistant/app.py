@@ -1,17 +1,48 @@
-import base64
 import json
 import logging
 import os
 import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import openai
-import requests
 from config import Config
 from dotenv import load_dotenv
-from flask import Flask, jsonify, redirect, render_template, request, url_for
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    session,
+    stream_with_context,
+    url_for,
+)
 from openai import AzureOpenAI
 from tabulate import tabulate
-from tools.utils import ask_database, connect_db, get_database_schema
+from tools.query_cache import QueryResultCache
+from tools.schema_cache import (
+    connection_identity,
+    get_cached_schema_catalog,
+    get_schema_fingerprint,
+)
+from tools.schema_index import SchemaIndex
+from tools.servicenow import (
+    DEFAULT_PROBLEM_FIELDS,
+    close_servicenow_clients,
+    get_servicenow_client,
+)
+from tools.session_store import create_session_store, trim_messages
+from tools.utils import (
+    QueryResult,
+    ask_database,
+    close_connection_pools,
+    connect_db,
+    get_connection_pool,
+    render_database_schema,
+)
 
 load_dotenv()
 
@@ -33,21 +64,58 @@ client = AzureOpenAI(
 DATABASE_PATH = os.environ.get("SQLITE_DB_PATH", os.path.join("data", "chinook.db"))
 
 # Global variables
-conversation_histories = {}
-conversation_lock = threading.Lock()
+conversation_store = create_session_store(
+    app.config["SESSION_STORE"],
+    db_path=app.config["SESSION_DB_PATH"],
+    max_sessions=app.config["SESSION_MAX_SESSIONS"],
+    ttl_seconds=app.config["SESSION_TTL_SECONDS"],
+)
 database_schema_string = ""
+database_schema_index = None
 database_schema_lock = threading.Lock()
+tool_executor = ThreadPoolExecutor(
+    max_workers=app.config["TOOL_CALL_MAX_WORKERS"], thread_name_prefix="tool-call"
+)
 
 current_db_credentials = None
-conversation_histories = {}
+query_result_cache = QueryResultCache(
+    max_entries=app.config["QUERY_CACHE_MAX_ENTRIES"],
+    max_bytes=app.config["QUERY_CACHE_MAX_BYTES"],
+    ttl_seconds=app.config["QUERY_CACHE_TTL_SECONDS"],
+    fingerprint_ttl_seconds=app.config["QUERY_CACHE_FINGERPRINT_TTL_SECONDS"],
+)
 database_schema_string = ""
 
 
+def load_database_schema(conn, db_type, schema_name=""):
+    """
+    Return the schema string and a SchemaIndex for the current connection,
+    reusing the on-disk schema cache.
+    """
+    catalog = get_cached_schema_catalog(conn, db_type, current_db_credentials, schema_name)
+    schema_string = render_database_schema(catalog, db_type, schema_name)
+    return schema_string, SchemaIndex(catalog, db_type, schema_name)
+
+
+def get_relevant_schema(question):
+    """Return only the parts of the current schema relevant to a question, within the token budget."""
+    with database_schema_lock:
+        schema_index = database_schema_index
+        schema_string = database_schema_string
+    if schema_index is None:
+        return schema_string
+    return schema_index.select(
+        question,
+        top_k=app.config["SCHEMA_CONTEXT_TOP_K"],
+        token_budget=app.config["SCHEMA_CONTEXT_TOKEN_BUDGET"],
+    )
+
+
 def initialize_default_db():
-    global current_db_credentials, database_schema_string
+    global current_db_credentials, database_schema_string, database_schema_index
     current_db_credentials = {"db_type": "sqlite", "db_path": DATABASE_PATH}
     conn = connect_db(db_type="sqlite", credentials=current_db_credentials)
-    database_schema_string = get_database_schema(conn, "sqlite")
+    database_schema_string, database_schema_index = load_database_schema(conn, "sqlite")
     conn.close()
 
 
@@ -58,16 +126,31 @@ initialize_default_db()
 def execute_sql_function(query, db_type):
     """Wrapper function to be called by the assistant."""
     print(db_type)
-    conn = connect_db(db_type=db_type, credentials=current_db_credentials)
-    response = ask_database(conn, query, db_type)
-    if isinstance(response, list):
-        # If response is a list of dictionaries, format it into a markdown table
-        if response:
-            headers = response[0].keys()
-            rows = [list(item.values()) for item in response]
+    identity = connection_identity(db_type, current_db_credentials)
+    pool = get_connection_pool(db_type, current_db_credentials)
+    schema_name = current_db_credentials.get("schema") or ""
+
+    def read_fingerprint():
+        with pool.connection() as conn:
+            return get_schema_fingerprint(conn, db_type, schema_name)
+
+    fingerprint = query_result_cache.schema_fingerprint(identity, read_fingerprint)
+    response = query_result_cache.get(identity, fingerprint, query)
+    if response is None:
+        with pool.connection() as conn:
+            response = ask_database(conn, query, db_type)
+        if isinstance(response, QueryResult):
+            query_result_cache.put(identity, fingerprint, query, response)
+    if isinstance(response, QueryResult):
+        # Format the columnar result into a markdown table
+        if response.row_count:
             # Use tabulate to format as a table
-            table = tabulate(rows, headers=headers, tablefmt="github")
+            table = tabulate(response.rows(), headers=response.column_names, tablefmt="github")
+            if response.truncated:
+                table += "\n\n" + response.truncation_note()
             return table
+        elif response.truncated:
+            return response.truncation_note()
         else:
             return "No results found."
     elif isinstance(response, dict) and "error" in response:
@@ -78,40 +161,39 @@ def execute_sql_function(query, db_type):
 
 def execute_api_call(params, db_type):
     """Function to make API calls to ServiceNow."""
-    # Get credentials and API details from current_db_credentials
-    api_base_url = current_db_credentials["host"]
     api_endpoint = "/api/now/table/problem"  # Default endpoint
-    username = current_db_credentials["user"]
-    password = current_db_credentials["password"]
-
-    # Build full URL
-    full_url = api_base_url.rstrip("/") + "/" + api_endpoint.lstrip("/")
-
-    # Encode credentials for Basic Auth
-    credentials = f"{username}:{password}"
-    b64Val = base64.b64encode(credentials.encode()).decode()
-    headers = {"Authorization": f"Basic {b64Val}", "Content-Type": "application/json"}
+    max_records = app.config["SERVICENOW_MAX_RECORDS"]
+
+    # Project a compact set of fields unless the assistant asked for specific ones
+    params = {
+        "sysparm_fields": DEFAULT_PROBLEM_FIELDS,
+        "sysparm_exclude_reference_link": "true",
+        **(params or {}),
+    }
+    if "sysparm_limit" in params:
+        limit = params.pop("sysparm_limit")
+        try:
+            max_records = max(1, min(int(limit), max_records))
+        except (TypeError, ValueError):
+            # The limit comes from the model; fall back to the configured maximum
+            pass
 
     try:
-        response = requests.get(full_url, headers=headers, params=params, verify=False)
-        response.raise_for_status()
-        data = response.json()
-        # Extract relevant information from the response
-        if "result" in data:
-            result = data["result"]
-            if isinstance(result, list):
-                if not result:
-                    return "No results found."
-                # Return as a formatted table
-                table_headers = result[0].keys()
-                rows = [list(item.values()) for item in result]
-                table = tabulate(rows, headers=table_headers, tablefmt="github")
-                return table
-            else:
-                # Return the single result as a JSON string
-                return json.dumps(result, indent=2)
-        else:
+        client = get_servicenow_client(current_db_credentials)
+        # Ask for one extra record to know whether the result was cut off
+        result = list(client.iter_records(api_endpoint, params=params, limit=max_records + 1))
+        if not result:
             return "No results found."
+        truncated = len(result) > max_records
+        result = result[:max_records]
+
+        # Return as a formatted table
+        table_headers = result[0].keys()
+        rows = [list(item.values()) for item in result]
+        table = tabulate(rows, headers=table_headers, tablefmt="github")
+        if truncated:
+            table += f"\n\n(Result truncated after {max_records} records.)"
+        return table
     except Exception as e:
         return f"An error occurred during the API call: {str(e)}"
 
@@ -131,7 +213,7 @@ def debug_sql_query_function(query, error_message, db_type):
     Ensure the corrected query is valid for a {db_type} database and does not modify any data.
 
     Database Schema:
-    {database_schema_string}
+    {get_relevant_schema(query + " " + error_message)}
     """
 
     messages = [{"role": "user", "content": correction_prompt}]
@@ -157,7 +239,7 @@ function_mappings = {
 
 @app.route("/connect", methods=["GET", "POST"])
 def connect():
-    global current_db_credentials, database_schema_string
+    global current_db_credentials, database_schema_string, database_schema_index
     if request.method == "POST":
         db_type = request.form.get("db_type", "postgresql")
         host = request.form["host"]
@@ -167,6 +249,11 @@ def connect():
         password = request.form["password"]
         schema_name = request.form["schema"]
 
+        # Drop pooled connections and cached results for the previous database
+        close_connection_pools()
+        close_servicenow_clients()
+        query_result_cache.clear()
+
         # Update global database credentials
         current_db_credentials = {
             "db_type": db_type,
@@ -175,13 +262,16 @@ def connect():
             "database": database,
             "user": user,
             "password": password,
+            "schema": schema_name,
         }
 
         # Try to connect to the new database
         try:
             conn = connect_db(db_type=db_type, credentials=current_db_credentials)
             print("Connection succesful")
-            new_database_schema_string = get_database_schema(conn, db_type, schema_name)
+            new_database_schema_string, new_database_schema_index = load_database_schema(
+                conn, db_type, schema_name
+            )
             conn.close()
         except Exception as e:
             error_message = f"Failed to connect to the database: {str(e)}"
@@ -190,8 +280,8 @@ def connect():
         # Update the global schema and clear conversation history
         with database_schema_lock:
             database_schema_string = new_database_schema_string
-        with conversation_lock:
-            conversation_histories.clear()
+            database_schema_index = new_database_schema_index
+        conversation_store.clear()
 
         return redirect(url_for("chat_page"))
     else:
@@ -200,26 +290,36 @@ def connect():
 
 @app.route("/connect_snow", methods=["GET", "POST"])
 def connect_snow():
-    global current_db_credentials, database_schema_string
+    global current_db_credentials, database_schema_string, database_schema_index
     if request.method == "POST":
         db_type = request.form.get("db_type", "servicenow")
         api = request.form["api"]
         user = request.form["user"]
         password = request.form["password"]
 
+        # Drop pooled connections and cached results for the previous database
+        close_connection_pools()
+        close_servicenow_clients()
+        query_result_cache.clear()
+
         # Update global credentials
         current_db_credentials = {"db_type": db_type, "host": api, "user": user, "password": password}
 
         # For simplicity, we'll assume the connection is always successful
         print("Connection successful")
-        with conversation_lock:
-            conversation_histories.clear()
+        conversation_store.clear()
 
         return redirect(url_for("chat_page"))
     else:
         return render_template("connect_snow.html")
 
 
+@app.route("/cache_stats")
+def cache_stats():
+    """Expose query result cache counters for sizing the cache."""
+    return jsonify(query_result_cache.stats())
+
+
 # Route for the index page
 @app.route("/")
 def index():
@@ -263,7 +363,7 @@ def chat_page():
 
 @app.route("/connect_env", methods=["POST"])
 def connect_env():
-    global current_db_credentials, database_schema_string
+    global current_db_credentials, database_schema_string, database_schema_index
 
     data = request.get_json()
     db_type = data.get("db_type")
@@ -282,6 +382,11 @@ def connect_env():
     if not all(value for key, value in credentials.items() if key != "schema"):
         return jsonify({"success": False, "error": f"Incomplete credentials for {db_type}."})
 
+    # Drop pooled connections and cached results for the previous database
+    close_connection_pools()
+    close_servicenow_clients()
+    query_result_cache.clear()
+
     # Update global credentials
     current_db_credentials = credentials
 
@@ -290,22 +395,25 @@ def connect_env():
         if db_type == "postgresql":
             conn = connect_db(db_type=db_type, credentials=current_db_credentials)
             schema_name = current_db_credentials.get("schema", None)
-            new_database_schema_string = get_database_schema(conn, db_type, schema_name)
+            new_database_schema_string, new_database_schema_index = load_database_schema(
+                conn, db_type, schema_name
+            )
             conn.close()
             with database_schema_lock:
                 database_schema_string = new_database_schema_string
+                database_schema_index = new_database_schema_index
         elif db_type == "sqlite":
             conn = connect_db(db_type=db_type, credentials=current_db_credentials)
-            new_database_schema_string = get_database_schema(conn, db_type)
+            new_database_schema_string, new_database_schema_index = load_database_schema(conn, db_type)
             conn.close()
             with database_schema_lock:
                 database_schema_string = new_database_schema_string
+                database_schema_index = new_database_schema_index
         elif db_type == "servicenow":
             # For simplicity, assume connection is always successful
             pass
 
-        with conversation_lock:
-            conversation_histories.clear()
+        conversation_store.clear()
 
         return jsonify({"success": True})
     except Exception as e:
@@ -313,13 +421,112 @@ def connect_env():
         return jsonify({"success": False, "error": error_message})
 
 
-@app.route("/chat", methods=["POST"])
-def chat():
+def stream_completion(messages, functions):
+    """
+    Stream one chat completion.
+
+    Yields ("token", text) for each content delta and finally ("message", dict)
+    with the assembled assistant message, including any tool calls.
+    """
+    stream = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        tools=functions,
+        tool_choice="auto",
+        stream=True,
+    )
+    content_parts = []
+    tool_calls = {}
+    for chunk in stream:
+        # Azure sends a leading chunk with only content-filter results
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+            yield "token", delta.content
+        for tool_call_delta in delta.tool_calls or []:
+            tool_call = tool_calls.setdefault(
+                tool_call_delta.index,
+                {"id": None, "type": "function", "function": {"name": "", "arguments": ""}},
+            )
+            if tool_call_delta.id:
+                tool_call["id"] = tool_call_delta.id
+            if tool_call_delta.function:
+                tool_call["function"]["name"] += tool_call_delta.function.name or ""
+                tool_call["function"]["arguments"] += tool_call_delta.function.arguments or ""
+
+    message = {"role": "assistant", "content": "".join(content_parts) or None}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+    yield "message", message
+
+
+def dispatch_tool_calls(calls, db_type):
+    """
+    Run (tool_call_id, function_name, function_args) calls concurrently on the tool executor.
+
+    Yields (call, response, elapsed_seconds) as each call finishes. A call not
+    finished TOOL_CALL_TIMEOUT_SECONDS after it was submitted yields a timeout
+    message instead, whether it was still queued or running. Queued calls are
+    cancelled; running SQL is stopped by the database's statement timeout.
+    """
+    timeout = app.config["TOOL_CALL_TIMEOUT_SECONDS"]
+
+    def run(call):
+        _, function_name, function_args = call
+        # Pass only required arguments
+        return function_mappings[function_name](**function_args, db_type=db_type)
+
+    submitted_at = time.monotonic()
+    deadline = submitted_at + timeout
+    futures = {}
+    for call in calls:
+        if call[1] in function_mappings:
+            futures[tool_executor.submit(run, call)] = call
+        else:
+            yield call, "I'm sorry, I cannot perform the requested action.", 0.0
+
+    pending = set(futures)
+    while pending:
+        wait_for = max(deadline - time.monotonic(), 0)
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            call = futures[future]
+            try:
+                response = future.result()
+            except Exception as e:
+                response = f"An error occurred while running {call[1]}: {e}"
+            yield call, response, time.monotonic() - submitted_at
+
+        now = time.monotonic()
+        if pending and now >= deadline:
+            for future in pending:
+                # Frees the worker if the call never started
+                future.cancel()
+                call = futures[future]
+                yield call, f"{call[1]} timed out after {timeout:g} seconds.", now - submitted_at
+            pending = set()
+
+
+def get_conversation_id():
+    """Return this browser session's conversation id, assigning one on first use."""
+    if "conversation_id" not in session:
+        session["conversation_id"] = uuid.uuid4().hex
+    return session["conversation_id"]
+
+
+def run_chat_turn(user_input, conversation_id):
+    """
+    Run one user turn through the assistant and its tool loop.
+
+    Yields (event, payload) pairs as work happens: "status", "tool_call",
+    "token", "database_response", then either "final" (the same payload the
+    /chat endpoint returns) or "error".
+    """
     logs = []
-    user_input = request.json.get("message").strip()
     database_response = ""
-    # Use a fixed conversation ID for simplicity
-    conversation_id = "default"
 
     # Determine the system prompt based on the database type
     db_type = current_db_credentials["db_type"]
@@ -377,19 +584,19 @@ def chat():
         Answer questions by executing SELECT queries using the `execute_sql_function`.
         """
 
-    # Initialize conversation history with the appropriate system prompt
-    with conversation_lock:
-        if conversation_id not in conversation_histories:
-            system_prompt = {"role": "system", "content": system_prompt_content}
-            conversation_histories[conversation_id] = [system_prompt]
-
-    # Retrieve conversation history
-    messages = conversation_histories[conversation_id].copy()
+    # Retrieve conversation history, starting new sessions with the system prompt
+    history = conversation_store.get(conversation_id)
+    if not history:
+        history = [{"role": "system", "content": system_prompt_content}]
+    messages = trim_messages(history, app.config["SESSION_TOKEN_BUDGET"])
     messages.append({"role": "user", "content": user_input})
 
-    # Get the current database schema from the global variable
-    with database_schema_lock:
-        current_database_schema_string = database_schema_string
+    # Pick the tables relevant to this question (and the previous one, for follow-ups)
+    previous_user_inputs = [
+        m["content"] for m in messages[:-1] if isinstance(m, dict) and m.get("role") == "user"
+    ]
+    schema_question = " ".join(previous_user_inputs[-1:] + [user_input])
+    current_database_schema_string = get_relevant_schema(schema_question)
 
     # Define the function specifications for OpenAI
     if db_type == "postgresql" or db_type == "sqlite":
@@ -470,76 +677,104 @@ def chat():
     status_updates = []
     # Loop to handle multiple function calls
     while True:
+        response_message = None
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                tools=functions,
-                tool_choice="auto",
-            )
+            for event, payload in stream_completion(messages, functions):
+                if event == "token":
+                    yield "token", {"content": payload}
+                else:
+                    response_message = payload
         except openai.APIError as e:
             logging.error(f"OpenAI API error: {e}")
-            return jsonify({"error": "An error occurred while communicating with the AI assistant."})
+            yield "error", {"error": "An error occurred while communicating with the AI assistant."}
+            return
 
         # Get the assistant's response
-        response_message = response.choices[0].message
         messages.append(response_message)
         logs.append(f"Assistant response: {response_message}")
 
         # Check if the assistant wants to call a function
-        if response_message.tool_calls:
-            for tool_call in response_message.tool_calls:
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
+        if response_message.get("tool_calls"):
+            calls = []
+            for tool_call in response_message["tool_calls"]:
+                function_name = tool_call["function"]["name"]
+                function_args = json.loads(tool_call["function"]["arguments"])
                 logging.info(f"Function call - Name: {function_name}, Arguments: {function_args}")
                 logs.append(f"Function call - Name: {function_name}, Arguments: {function_args}")
+                yield "tool_call", {"name": function_name, "arguments": function_args}
+                calls.append((tool_call["id"], function_name, function_args))
 
                 # Add status update with function name
                 status_updates.append(f"Running {function_name}")
-
-                # Handle function calls
-                if function_name in function_mappings:
-                    # Pass only required arguments
-                    function_response = function_mappings[function_name](**function_args, db_type=db_type)
-                    function_response_str = str(function_response)  # Ensure it's a string
-                    database_response = function_response_str
-                    print(f"Function response: {function_response_str}")
-                    # Add a 'tool' message with the correct 'tool_call_id'
-                    messages.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "content": function_response_str,
-                        }
-                    )
-                    logs.append(f"Function response: {function_response_str}")
-                else:
-                    assistant_reply = "I'm sorry, I cannot perform the requested action."
-                    # database_response= ''
-                    messages.append({"role": "assistant", "content": assistant_reply})
-                    break
+                yield "status", {"message": status_updates[-1]}
+
+            # Run the calls concurrently; results arrive in completion order
+            function_responses = {}
+            for (tool_call_id, function_name, _), function_response, elapsed in dispatch_tool_calls(
+                calls, db_type
+            ):
+                function_responses[tool_call_id] = str(function_response)  # Ensure it's a string
+                logs.append(f"Function {function_name} ({tool_call_id}) finished in {elapsed:.2f}s")
+                yield "status", {"message": f"Finished {function_name} in {elapsed:.2f}s"}
+
+            # Add 'tool' messages in the order the assistant requested them
+            for tool_call_id, function_name, _ in calls:
+                function_response_str = function_responses[tool_call_id]
+                database_response = function_response_str
+                print(f"Function response: {function_response_str}")
+                messages.append(
+                    {
+                        "role": "tool",
+                        "tool_call_id": tool_call_id,
+                        "content": function_response_str,
+                    }
+                )
+                logs.append(f"Function response: {function_response_str}")
+            yield "database_response", {"content": database_response}
             # Continue the loop to let the assistant process the function responses
             continue
         else:
-            # Assistant has provided a final answer
-            assistant_reply = response_message.content
-            if not response_message.tool_calls:
-                status_updates.append("Generating final response")
-            # database_response = ''
-            messages.append({"role": "assistant", "content": assistant_reply})
+            # Assistant has provided a final answer, already recorded in messages
+            assistant_reply = response_message["content"]
+            status_updates.append("Generating final response")
+            yield "status", {"message": status_updates[-1]}
             break  # Exit the loop
 
-    # Update the conversation history
-    with conversation_lock:
-        conversation_histories[conversation_id] = messages
+    # Update the conversation history, trimmed so it stays within the token budget
+    conversation_store.save(
+        conversation_id, trim_messages(messages, app.config["SESSION_TOKEN_BUDGET"])
+    )
 
-    return jsonify(
-        {
-            "message": assistant_reply,
-            "logs": logs,
-            "database_response": database_response,
-            "status_updates": status_updates,
-        }
+    yield "final", {
+        "message": assistant_reply,
+        "logs": logs,
+        "database_response": database_response,
+        "status_updates": status_updates,
+    }
+
+
+@app.route("/chat", methods=["POST"])
+def chat():
+    user_input = request.json.get("message").strip()
+    for event, payload in run_chat_turn(user_input, get_conversation_id()):
+        if event in ("final", "error"):
+            return jsonify(payload)
+
+
+@app.route("/chat_stream", methods=["POST"])
+def chat_stream():
+    """Server-sent events variant of /chat that pushes progress as it happens."""
+    user_input = request.json.get("message").strip()
+    conversation_id = get_conversation_id()
+
+    def generate():
+        for event, payload in run_chat_turn(user_input, conversation_id):
+            yield f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -10,10 +10,39 @@ class Config:
     # General Configurations
     DEBUG = True  # or False in production
 
+    # Signs the session cookie that carries each browser's conversation id
+    SECRET_KEY = os.getenv("FLASK_SECRET_KEY", os.urandom(24).hex())
+
+    # Conversation history storage: "memory" (LRU with TTL) or "sqlite"
+    SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+    SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+    SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+    SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+    # Approximate token budget for the history re-sent on every completion
+    SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "6000"))
+
     # OpenAI Configurations
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENAI_API_HOST = os.getenv("OPENAI_API_HOST")
 
+    # Schema context sent to the model: number of best-matching tables (before
+    # foreign-key expansion) and the approximate token budget for the schema text
+    SCHEMA_CONTEXT_TOP_K = int(os.getenv("SCHEMA_CONTEXT_TOP_K", "5"))
+    SCHEMA_CONTEXT_TOKEN_BUDGET = int(os.getenv("SCHEMA_CONTEXT_TOKEN_BUDGET", "4000"))
+
+    # Query result cache for repeated SELECTs
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256"))
+    QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", "50000000"))
+    QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "300"))
+    # How long a schema fingerprint is trusted before it is read from the database again
+    QUERY_CACHE_FINGERPRINT_TTL_SECONDS = float(
+        os.getenv("QUERY_CACHE_FINGERPRINT_TTL_SECONDS", "30")
+    )
+
+    # Concurrent execution of the tool calls returned in one assistant response
+    TOOL_CALL_MAX_WORKERS = int(os.getenv("TOOL_CALL_MAX_WORKERS", "8"))
+    TOOL_CALL_TIMEOUT_SECONDS = float(os.getenv("TOOL_CALL_TIMEOUT_SECONDS", "60"))
+
     # PostgreSQL Database Configurations
     POSTGRESQL_CONFIG = {
         "db_type": "postgresql",
@@ -32,3 +61,6 @@ class Config:
         "user": os.getenv("SERVICENOW_USER"),
         "password": os.getenv("SERVICENOW_PASSWORD"),
     }
+
+    # Maximum ServiceNow records returned to the assistant per API call
+    SERVICENOW_MAX_RECORDS = int(os.getenv("SERVICENOW_MAX_RECORDS", "500"))
@@ -0,0 +1,33 @@
+# gunicorn.conf.py
+# Runs the app on gevent workers so each chat, including long-lived
+# /chat_stream responses, is a cheap greenlet rather than a whole thread.
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+# A single worker, with gevent providing the concurrency: the database chosen
+# on /connect, the default in-memory conversation store and the generated
+# session-cookie key all live in the worker process, so other workers would
+# not see them.
+workers = 1
+worker_class = "gevent"
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+timeout = 300
+
+
+def on_starting(server):
+    # More workers (e.g. gunicorn -w 4) need state that every worker shares
+    if server.cfg.workers > 1:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        if not os.getenv("FLASK_SECRET_KEY"):
+            raise RuntimeError("FLASK_SECRET_KEY must be set to run more than one worker")
+        if os.getenv("SESSION_STORE", "memory") != "sqlite":
+            raise RuntimeError("SESSION_STORE=sqlite is required to run more than one worker")
+
+
+def post_fork(server, worker):
+    # Make psycopg2 yield to other greenlets while waiting on PostgreSQL
+    from psycogreen.gevent import patch_psycopg
+
+    patch_psycopg()
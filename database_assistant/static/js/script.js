@@ -95,60 +95,97 @@ $(document).ready(function () {
         // Show initial loading spinner
         showLoadingSpinner('Processing...');
 
-        // Send message to the server
-        $.ajax({
-            url: '/chat',
-            type: 'POST',
-            contentType: 'application/json',
-            data: JSON.stringify({ message: userInput }),
-            success: function (data) {
-                if (data.error) {
-                    hideLoadingSpinner();  // Hide spinner on error
-                    appendMessage('Error', data.error);
-
-                    if (data.error.includes('No database connection')) {
-                        setTimeout(function () {
-                            window.location.href = '/connect';
-                        }, 2000);
-                    }
+        // Stream progress, tokens and results from the server as they happen
+        streamChat(userInput);
+    });
+
+    // Read server-sent events from /chat_stream and update the page per event
+    async function streamChat(userInput) {
+        let liveText = '';
+        let liveElement = null;
+        let finished = false;
+
+        function handleEvent(event, data) {
+            if (event === 'status') {
+                $('#loading-message').text(data.message);
+            } else if (event === 'tool_call') {
+                $('#loading-message').text('Running ' + data.name);
+            } else if (event === 'token') {
+                hideLoadingSpinner();
+                liveText += data.content;
+                if (!liveElement) {
+                    liveElement = $('<span>');
+                    appendMessage('Assistant', liveElement, null, true);
+                }
+                liveElement.text(liveText);
+                $('#chat-window').scrollTop($('#chat-window')[0].scrollHeight);
+            } else if (event === 'database_response') {
+                displayResults(data.content);
+            } else if (event === 'final') {
+                finished = true;
+                hideLoadingSpinner();
+                const markdownContent = marked.parse(data.message || '');
+                if (liveElement) {
+                    // Replace the raw streamed text with rendered markdown
+                    liveElement.html(markdownContent);
                 } else {
-                    const statusUpdates = data.status_updates;
-                    if (statusUpdates && statusUpdates.length > 0) {
-                        let index = 0;
-                        $('#loading-message').text(statusUpdates[index]); // Show first status
-                        index++;
-                        let spinnerInterval = setInterval(function() {
-                            if (index < statusUpdates.length) {
-                                $('#loading-message').text(statusUpdates[index]);
-                                index++;
-                            } else {
-                                clearInterval(spinnerInterval);
-                                hideLoadingSpinner();
-                                // Now display assistant's message and results
-                                const markdownContent = marked.parse(data.message);
-                                const database_response = data.database_response;
-                                appendMessage('Assistant', markdownContent, true, true);
-                                updateLogs(data.logs);
-                                displayResults(database_response);
-                            }
-                        }, 1000); // Adjust the duration as needed
-                    } else {
-                        hideLoadingSpinner();
-                        // No status updates, proceed as usual
-                        const markdownContent = marked.parse(data.message);
-                        const database_response = data.database_response;
-                        appendMessage('Assistant', markdownContent, true, true);
-                        updateLogs(data.logs);
-                        displayResults(database_response);
-                    }
+                    appendMessage('Assistant', markdownContent, true, true);
+                }
+                updateLogs(data.logs);
+                displayResults(data.database_response);
+            } else if (event === 'error') {
+                finished = true;
+                hideLoadingSpinner();
+                appendMessage('Error', data.error);
+
+                if (data.error.includes('No database connection')) {
+                    setTimeout(function () {
+                        window.location.href = '/connect';
+                    }, 2000);
                 }
-            },
-            error: function () {
-                hideLoadingSpinner();  // Hide spinner on error
-                appendMessage('Error', 'An error occurred while communicating with the server.');
             }
-        });
-    });
+        }
+
+        try {
+            const response = await fetch('/chat_stream', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ message: userInput })
+            });
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // Events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    let event = 'message';
+                    let data = '';
+                    rawEvent.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) event = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    });
+                    handleEvent(event, JSON.parse(data));
+                }
+            }
+        } catch (err) {
+            finished = true;
+            hideLoadingSpinner();
+            appendMessage('Error', 'An error occurred while communicating with the server.');
+        }
+
+        if (!finished) {
+            hideLoadingSpinner();
+            appendMessage('Error', 'The server closed the connection before replying.');
+        }
+    }
 
     // Function to append messages to the chat window
     function appendMessage(sender, message, database_response, isHTML = false, isAssistantMessage = false) {
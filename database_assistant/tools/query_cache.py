@@ -0,0 +1,143 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import sqlparse
+from sqlparse import tokens
+
+_DOLLAR_QUOTE = re.compile(r"\$\w*\$")
+
+
+def normalize_sql(query):
+    r"""
+    Normalize SQL text so trivially different spellings share a cache entry.
+
+    Only whitespace between tokens is collapsed. String literals, including
+    PostgreSQL dollar-quoted ones, are kept as written, so queries that differ
+    inside a literal never share a result.
+
+    >>> normalize_sql("SELECT *\n  FROM t;") == normalize_sql("select * from t")
+    True
+    >>> normalize_sql("SELECT 'a   b'") == normalize_sql("SELECT 'a b'")
+    False
+    """
+    if _DOLLAR_QUOTE.search(query):
+        # sqlparse does not lex $tag$...$tag$ strings, so key on the text as written
+        return query.strip()
+    formatted = sqlparse.format(query, keyword_case="lower", strip_comments=True)
+    parts = []
+    for ttype, value in sqlparse.lexer.tokenize(formatted):
+        if ttype in tokens.Whitespace:
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        else:
+            parts.append(value)
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+class QueryResultCache:
+    """
+    A thread-safe LRU cache of ``QueryResult`` objects.
+
+    Entries are keyed by connection identity and normalized SQL, expire after
+    ``ttl_seconds`` and are evicted least-recently-used first once either
+    ``max_entries`` or ``max_bytes`` (the results' rendered size) is exceeded.
+    All entries for a connection are dropped when its schema fingerprint changes;
+    the fingerprint itself is re-read at most every ``fingerprint_ttl_seconds``.
+    """
+
+    def __init__(
+        self, max_entries=256, max_bytes=50_000_000, ttl_seconds=300, fingerprint_ttl_seconds=30
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.fingerprint_ttl_seconds = fingerprint_ttl_seconds
+        self._entries = OrderedDict()  # key -> (result, stored_at)
+        self._fingerprints = {}  # connection identity -> schema fingerprint
+        self._fingerprints_read_at = {}  # connection identity -> when it was last read
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _drop(self, key):
+        result, _ = self._entries.pop(key)
+        self._bytes -= result.byte_count
+
+    def _check_fingerprint(self, identity, fingerprint):
+        """Drop a connection's entries if its schema changed. Caller holds the lock."""
+        if self._fingerprints.get(identity, fingerprint) != fingerprint:
+            for key in [k for k in self._entries if k[0] == identity]:
+                self._drop(key)
+            self.invalidations += 1
+        self._fingerprints[identity] = fingerprint
+
+    def schema_fingerprint(self, identity, read_fingerprint):
+        """
+        Return the connection's schema fingerprint, calling ``read_fingerprint``
+        only when the last reading is older than ``fingerprint_ttl_seconds``, so
+        a cache hit does not have to touch the database.
+        """
+        with self._lock:
+            read_at = self._fingerprints_read_at.get(identity)
+            if read_at is not None and time.monotonic() - read_at <= self.fingerprint_ttl_seconds:
+                return self._fingerprints[identity]
+        fingerprint = read_fingerprint()
+        with self._lock:
+            self._check_fingerprint(identity, fingerprint)
+            self._fingerprints_read_at[identity] = time.monotonic()
+        return fingerprint
+
+    def get(self, identity, fingerprint, query):
+        key = (identity, normalize_sql(query))
+        with self._lock:
+            self._check_fingerprint(identity, fingerprint)
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl_seconds:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, identity, fingerprint, query, result):
+        # A single result larger than the whole budget is not worth caching
+        if result.byte_count > self.max_bytes:
+            return
+        key = (identity, normalize_sql(query))
+        with self._lock:
+            self._check_fingerprint(identity, fingerprint)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (result, time.monotonic())
+            self._bytes += result.byte_count
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._fingerprints.clear()
+            self._fingerprints_read_at.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from tools.utils import get_schema_catalog
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached catalog layout changes so stale files are ignored
+SCHEMA_CACHE_VERSION = 1
+SCHEMA_CACHE_DIR = os.environ.get(
+    "SCHEMA_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".schema_cache")
+)
+
+
+def connection_identity(db_type, credentials):
+    """Return a stable identity for a database connection, excluding secrets."""
+    credentials = credentials or {}
+    if db_type == "sqlite":
+        return f"sqlite:{os.path.abspath(credentials.get('db_path', 'data/chinook.db'))}"
+    return (
+        f"{db_type}:{credentials.get('user')}@{credentials.get('host')}:"
+        f"{credentials.get('port')}/{credentials.get('database')}"
+    )
+
+
+def get_schema_fingerprint(conn, db_type, schema_name=""):
+    """
+    Return a cheap fingerprint that changes whenever the schema changes.
+
+    SQLite bumps ``PRAGMA schema_version`` on every DDL statement. For PostgreSQL
+    we hash each table's ``relfilenode`` and attribute count plus the number of
+    foreign keys, which changes on CREATE/DROP/ALTER and table rewrites.
+    """
+    if db_type == "sqlite":
+        return str(conn.execute("PRAGMA schema_version;").fetchone()[0])
+
+    if db_type == "postgresql":
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT md5(
+                coalesce(string_agg(
+                    c.relname || ':' || c.relfilenode || ':' ||
+                    (SELECT count(*) FROM pg_catalog.pg_attribute AS a
+                     WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped),
+                    ',' ORDER BY c.relname), '')
+                || '|' ||
+                (SELECT count(*) FROM pg_catalog.pg_constraint AS k
+                 WHERE k.contype = 'f' AND k.connamespace = n.oid)
+            )
+            FROM pg_catalog.pg_namespace AS n
+            LEFT JOIN pg_catalog.pg_class AS c
+                   ON c.relnamespace = n.oid AND c.relkind IN ('r', 'p')
+            WHERE n.nspname = %s
+            GROUP BY n.oid;
+            """,
+            (schema_name,),
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] if row else ""
+
+    raise ValueError("Unsupported database type. Use 'sqlite' or 'postgresql'.")
+
+
+def _cache_path(db_type, credentials, schema_name):
+    key = f"{connection_identity(db_type, credentials)}|{schema_name or ''}"
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return os.path.join(SCHEMA_CACHE_DIR, f"{digest}.json")
+
+
+def _read_cache(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(path, entry):
+    """Write the cache entry atomically so concurrent readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write schema cache {path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def get_cached_schema_catalog(conn, db_type, credentials, schema_name=""):
+    """
+    Return the schema catalog (see ``get_schema_catalog``), served from disk when unchanged.
+
+    The cache is keyed by connection identity and schema name and validated
+    against ``get_schema_fingerprint``; a mismatch triggers a full introspection
+    and rewrites the cache file.
+    """
+    path = _cache_path(db_type, credentials, schema_name)
+    fingerprint = get_schema_fingerprint(conn, db_type, schema_name)
+
+    entry = _read_cache(path)
+    if (
+        entry
+        and entry.get("version") == SCHEMA_CACHE_VERSION
+        and entry.get("fingerprint") == fingerprint
+    ):
+        logger.info(f"Schema cache hit for {connection_identity(db_type, credentials)}")
+        return entry["catalog"]
+
+    logger.info(f"Schema cache miss for {connection_identity(db_type, credentials)}")
+    catalog = get_schema_catalog(conn, db_type, schema_name)
+    _write_cache(
+        path,
+        {"version": SCHEMA_CACHE_VERSION, "fingerprint": fingerprint, "catalog": catalog},
+    )
+    return catalog
@@ -0,0 +1,142 @@
+import math
+import re
+from collections import Counter
+
+from tools.utils import estimate_tokens, render_table_schema
+
+OTHER_TABLES_HEADER = "Other tables (query the database catalog for their columns if needed): "
+OTHER_TABLES_MORE = " ... and {count} more"
+
+_CAMEL_CASE = re.compile(r"([a-z0-9])([A-Z])")
+_WORD = re.compile(r"[A-Za-z0-9]+")
+
+
+def tokenize(text):
+    """Split text into lowercase terms, breaking snake_case and CamelCase identifiers."""
+    terms = []
+    for word in _WORD.findall(_CAMEL_CASE.sub(r"\1 \2", text or "")):
+        word = word.lower()
+        # Cheap plural folding so "customers" matches "customer"
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+class SchemaIndex:
+    """
+    A per-table BM25 index over a schema catalog with foreign-key graph expansion.
+
+    Each table becomes one document built from its name (weighted double),
+    column names and column types. ``select`` ranks tables against a question,
+    adds their join neighbours and renders as many as fit in the token budget.
+    """
+
+    def __init__(self, catalog, db_type, schema="", k1=1.2, b=0.75):
+        self.db_type = db_type
+        self.schema = schema
+        self.k1 = k1
+        self.b = b
+        self.tables = catalog["tables"]
+
+        self.fk_by_table = {}
+        self.neighbours = {name: set() for name in self.tables}
+        for fk in catalog["foreign_keys"]:
+            self.fk_by_table.setdefault(fk["table_name"], []).append(fk)
+            self.neighbours.setdefault(fk["table_name"], set()).add(fk["foreign_table_name"])
+            self.neighbours.setdefault(fk["foreign_table_name"], set()).add(fk["table_name"])
+
+        self.documents = {}
+        self.term_counts = {}
+        document_frequency = Counter()
+        for table_name, columns in self.tables.items():
+            self.documents[table_name] = render_table_schema(
+                table_name, columns, self.fk_by_table.get(table_name, []), db_type, schema
+            )
+            terms = tokenize(table_name) * 2
+            for col in columns:
+                terms += tokenize(col["column_name"]) + tokenize(str(col["data_type"]))
+            counts = Counter(terms)
+            self.term_counts[table_name] = counts
+            document_frequency.update(counts.keys())
+
+        n_docs = max(len(self.tables), 1)
+        self.avg_length = sum(sum(c.values()) for c in self.term_counts.values()) / n_docs
+        self.idf = {
+            term: math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def score(self, question):
+        """Return {table_name: BM25 score} for tables matching any question term."""
+        query_terms = set(tokenize(question))
+        scores = {}
+        for table_name, counts in self.term_counts.items():
+            length = sum(counts.values())
+            total = 0.0
+            for term in query_terms:
+                tf = counts.get(term)
+                if not tf:
+                    continue
+                norm = tf + self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+                total += self.idf[term] * tf * (self.k1 + 1) / norm
+            if total > 0:
+                scores[table_name] = total
+        return scores
+
+    def select(self, question, top_k=5, token_budget=4000):
+        """
+        Return the schema context for a question, limited to ``token_budget`` tokens.
+
+        Small schemas that already fit the budget are returned whole. Otherwise
+        the ``top_k`` best-matching tables are rendered first, followed by their
+        foreign-key neighbours. Whatever budget is left lists the names of the
+        remaining tables so the assistant knows they exist.
+        """
+        full_schema = "\n\n".join(self.documents.values())
+        if estimate_tokens(full_schema) <= token_budget:
+            return full_schema
+
+        scores = self.score(question)
+        seeds = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        ordered = list(seeds)
+        for table_name in seeds:
+            for neighbour in sorted(
+                self.neighbours.get(table_name, ()), key=lambda t: -scores.get(t, 0)
+            ):
+                if neighbour not in ordered and neighbour in self.documents:
+                    ordered.append(neighbour)
+
+        # Estimates are summed per piece (separators included), which never
+        # undercounts the joined text, so the result stays within the budget.
+        list_overhead = estimate_tokens(
+            OTHER_TABLES_HEADER + OTHER_TABLES_MORE.format(count=len(self.documents))
+        )
+        remaining = token_budget - list_overhead
+        chosen = []
+        skipped = []
+        for table_name in ordered:
+            cost = estimate_tokens(self.documents[table_name] + "\n\n")
+            if cost > remaining:
+                skipped.append(table_name)
+                continue
+            chosen.append(table_name)
+            remaining -= cost
+
+        # Relevant tables that did not fit come first in the list of names
+        other_tables = skipped + sorted(name for name in self.documents if name not in ordered)
+        listed = []
+        for table_name in other_tables:
+            cost = estimate_tokens(table_name + ", ")
+            if cost > remaining:
+                break
+            listed.append(table_name)
+            remaining -= cost
+
+        sections = [self.documents[name] for name in chosen]
+        if other_tables and list_overhead <= token_budget:
+            names = ", ".join(listed)
+            if len(listed) < len(other_tables):
+                names += OTHER_TABLES_MORE.format(count=len(other_tables) - len(listed))
+            sections.append(OTHER_TABLES_HEADER + names)
+        return "\n\n".join(sections)
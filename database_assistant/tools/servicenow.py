@@ -0,0 +1,126 @@
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Fields returned when the caller does not ask for specific ones
+DEFAULT_PROBLEM_FIELDS = (
+    "number,short_description,state,priority,assigned_to,assignment_group,"
+    "opened_at,sys_updated_on"
+)
+
+
+class ServiceNowClient:
+    """
+    A reusable ServiceNow REST client.
+
+    A single ``requests.Session`` keeps TLS connections alive across calls and
+    carries the Basic auth credentials; 429 and 5xx responses are retried with
+    exponential backoff (honouring ``Retry-After``). The method names mirror the
+    async ``ServiceNowClient`` in ``MCP/snow_mcp/snow_server.py``.
+    """
+
+    def __init__(
+        self,
+        instance_url,
+        username,
+        password,
+        timeout=30,
+        page_size=100,
+        max_retries=3,
+        pool_size=10,
+        verify=False,
+    ):
+        self.instance_url = instance_url.rstrip("/")
+        self.timeout = timeout
+        self.page_size = page_size
+        self.session = requests.Session()
+        self.session.auth = (username, password)
+        self.session.verify = verify
+        self.session.headers.update({"Accept": "application/json"})
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def request(self, method, path, params=None):
+        url = f"{self.instance_url}/{path.lstrip('/')}"
+        logger.info(f"Making request to {url} with params {params}")
+        response = self.session.request(method, url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _get_page(self, path, params):
+        """Return one page of records and the X-Total-Count header (None if absent)."""
+        url = f"{self.instance_url}/{path.lstrip('/')}"
+        logger.info(f"Making request to {url} with params {params}")
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        total = response.headers.get("X-Total-Count")
+        return response.json().get("result", []), int(total) if total is not None else None
+
+    def iter_records(self, path, params=None, limit=None):
+        """
+        Yield records from a Table API path page by page using sysparm_limit/sysparm_offset.
+
+        ServiceNow applies the offset before ACL filtering, so a page can come
+        back short (or empty) before the end of the table. The offset therefore
+        advances by the page size requested, and paging stops once it reaches
+        ``X-Total-Count`` or, without that header, at the first empty page.
+        Stops after ``limit`` records when given, so callers never hold more than
+        one page in memory.
+        """
+        params = dict(params or {})
+        offset = int(params.pop("sysparm_offset", 0))
+        returned = 0
+        while limit is None or returned < limit:
+            page_size = self.page_size if limit is None else min(self.page_size, limit - returned)
+            page, total = self._get_page(
+                path, {**params, "sysparm_limit": page_size, "sysparm_offset": offset}
+            )
+            yield from page
+            returned += len(page)
+            offset += page_size
+            if total is not None:
+                if offset >= total:
+                    return
+            elif not page:
+                return
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_servicenow_client(credentials):
+    """Return the shared client for these credentials, creating it on first use."""
+    key = (credentials["host"], credentials["user"], credentials["password"])
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = ServiceNowClient(credentials["host"], credentials["user"], credentials["password"])
+            _clients[key] = client
+        return client
+
+
+def close_servicenow_clients():
+    """Close every shared client, e.g. when the app switches to another instance."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
@@ -0,0 +1,128 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from tools.utils import estimate_tokens
+
+
+def estimate_message_tokens(message):
+    return estimate_tokens(json.dumps(message, default=str))
+
+
+def trim_messages(messages, token_budget):
+    """
+    Return the conversation trimmed to roughly ``token_budget`` tokens.
+
+    The system prompt is always kept. The rest is split into turns starting at
+    each user message, so an assistant tool call is never separated from its
+    tool responses, and the newest turns that fit the budget are kept. The
+    latest turn is kept even if it alone exceeds the budget.
+    """
+    if not messages:
+        return []
+
+    system = [messages[0]] if messages[0].get("role") == "system" else []
+    rest = messages[len(system):]
+
+    turns = []
+    for message in rest:
+        if message.get("role") == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+
+    remaining = token_budget - sum(estimate_message_tokens(m) for m in system)
+    kept = []
+    for turn in reversed(turns):
+        cost = sum(estimate_message_tokens(m) for m in turn)
+        if kept and cost > remaining:
+            break
+        kept.append(turn)
+        remaining -= cost
+
+    return system + [message for turn in reversed(kept) for message in turn]
+
+
+class InMemorySessionStore:
+    """Conversation histories kept in process memory, bounded by count (LRU) and TTL."""
+
+    def __init__(self, max_sessions=1000, ttl_seconds=3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()  # session_id -> (messages, last_used)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def save(self, session_id, messages):
+        with self._lock:
+            self._sessions[session_id] = (messages, time.monotonic())
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+
+class SQLiteSessionStore:
+    """Conversation histories persisted as JSON in an SQLite file, expired by TTL."""
+
+    def __init__(self, db_path, ttl_seconds=3600):
+        self.ttl_seconds = ttl_seconds
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    messages TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT messages, last_used FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return json.loads(row[0])
+
+    def save(self, session_id, messages):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, messages, last_used) VALUES (?, ?, ?)",
+                (session_id, json.dumps(messages, default=str), now),
+            )
+            self._conn.execute(
+                "DELETE FROM sessions WHERE last_used < ?", (now - self.ttl_seconds,)
+            )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions")
+
+
+def create_session_store(backend, db_path=None, max_sessions=1000, ttl_seconds=3600):
+    """Build the session store named by ``backend`` ('memory' or 'sqlite')."""
+    if backend == "memory":
+        return InMemorySessionStore(max_sessions=max_sessions, ttl_seconds=ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteSessionStore(db_path, ttl_seconds=ttl_seconds)
+    raise ValueError("Unsupported session store. Use 'memory' or 'sqlite'.")
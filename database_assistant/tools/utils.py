@@ -1,17 +1,49 @@
+import logging
 import os
 import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 
 import psycopg2
 import psycopg2.extras
 
+logger = logging.getLogger(__name__)
 
-def connect_db(db_type="sqlite", credentials=None):
+# Pool defaults, overridable through the environment
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "5"))
+DB_POOL_MAX_IDLE_SECONDS = float(os.environ.get("DB_POOL_MAX_IDLE_SECONDS", "300"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("DB_POOL_ACQUIRE_TIMEOUT", "30"))
+
+# Result limits for ask_database, overridable through the environment. The
+# result goes back to the model as a padded table, so the byte cap applies to
+# that rendered table (32 KB is about 8k tokens) to keep one query from filling
+# the model's context window.
+DB_RESULT_MAX_ROWS = int(os.environ.get("DB_RESULT_MAX_ROWS", "1000"))
+DB_RESULT_MAX_BYTES = int(os.environ.get("DB_RESULT_MAX_BYTES", "32000"))
+DB_FETCH_BATCH_SIZE = int(os.environ.get("DB_FETCH_BATCH_SIZE", "500"))
+
+# Longest a single statement may run before the database aborts it, so a query
+# whose tool call has already timed out stops holding a pooled connection
+DB_STATEMENT_TIMEOUT_SECONDS = float(os.environ.get("DB_STATEMENT_TIMEOUT_SECONDS", "60"))
+
+# Rough characters-per-token ratio for OpenAI tokenizers, shared by every
+# prompt budget (schema context, conversation history)
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def connect_db(db_type="sqlite", credentials=None, check_same_thread=True):
     """Connect to the specified database."""
     if db_type == "sqlite":
         db_path = credentials.get("db_path", "data/chinook.db")
         if not os.path.exists(db_path):
             raise FileNotFoundError(f"SQLite database file not found at {db_path}")
-        conn = sqlite3.connect(db_path)
+        conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
         return conn
     elif db_type == "postgresql":
         try:
@@ -21,6 +53,7 @@ def connect_db(db_type="sqlite", credentials=None):
                 database=credentials["database"],
                 user=credentials["user"],
                 password=credentials["password"],
+                options=f"-c statement_timeout={int(DB_STATEMENT_TIMEOUT_SECONDS * 1000)}",
             )
             return conn
         except Exception as e:
@@ -31,6 +64,172 @@ def connect_db(db_type="sqlite", credentials=None):
         raise ValueError("Unsupported database type. Use 'sqlite' or 'postgresql'.")
 
 
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of connections for a single set of credentials.
+
+    Connections are handed out one caller at a time, checked with a cheap
+    ``SELECT 1`` before reuse and closed once they have been idle for longer
+    than ``max_idle_seconds``.
+    """
+
+    def __init__(
+        self,
+        db_type,
+        credentials,
+        max_size=DB_POOL_MAX_SIZE,
+        max_idle_seconds=DB_POOL_MAX_IDLE_SECONDS,
+        acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+    ):
+        self.db_type = db_type
+        self.credentials = dict(credentials or {})
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.acquire_timeout = acquire_timeout
+        self._idle = []  # (connection, last_used) pairs, most recently used last
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _open(self):
+        # Pooled SQLite connections move between Flask worker threads, but the
+        # pool guarantees only one thread uses a connection at a time.
+        return connect_db(
+            db_type=self.db_type, credentials=self.credentials, check_same_thread=False
+        )
+
+    def _is_healthy(self, conn):
+        if self.db_type == "postgresql" and conn.closed:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self):
+        """Close idle connections that exceeded max_idle_seconds. Caller holds the lock."""
+        now = time.monotonic()
+        keep = []
+        for conn, last_used in self._idle:
+            if now - last_used > self.max_idle_seconds:
+                self._close_quietly(conn)
+            else:
+                keep.append((conn, last_used))
+        self._idle = keep
+
+    def acquire(self):
+        """Return a healthy connection, opening a new one if the pool has room."""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise ConnectionError("Connection pool has been closed.")
+                self._evict_idle()
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    conn = None
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ConnectionError(
+                        f"Timed out waiting for a database connection (pool size {self.max_size})."
+                    )
+                self._cond.wait(remaining)
+
+        # Connect and health-check outside the lock so slow handshakes do not
+        # block other threads returning connections.
+        try:
+            if conn is not None and not self._is_healthy(conn):
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+            return conn
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        """Return a connection to the pool, resetting any open transaction."""
+        try:
+            conn.rollback()
+            reusable = True
+        except Exception:
+            reusable = False
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._close_quietly(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that acquires a connection and always releases it."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close every idle connection; in-use connections are closed on release."""
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._close_quietly(conn)
+            self._idle = []
+            self._cond.notify_all()
+
+
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+
+def _pool_key(db_type, credentials):
+    return (db_type,) + tuple(sorted((k, str(v)) for k, v in (credentials or {}).items()))
+
+
+def get_connection_pool(db_type, credentials):
+    """Return the shared connection pool for these credentials, creating it on first use."""
+    key = _pool_key(db_type, credentials)
+    with _connection_pools_lock:
+        pool = _connection_pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_type, credentials)
+            _connection_pools[key] = pool
+        return pool
+
+
+def close_connection_pools():
+    """Tear down every pool, e.g. when the app switches to a different database."""
+    with _connection_pools_lock:
+        pools = list(_connection_pools.values())
+        _connection_pools.clear()
+    for pool in pools:
+        pool.close()
+    logger.info(f"Closed {len(pools)} database connection pool(s)")
+
+
 def get_table_names(conn, db_type, schema_name=""):
     """Return a list of table names for SQLite or PostgreSQL."""
     table_names = []
@@ -65,7 +264,6 @@ def get_column_names(conn, table_name, db_type, schema_name=""):
     if db_type == "sqlite":
         query = f"PRAGMA table_info('{table_name}');"
         cursor = conn.execute(query)
-        print(cursor.fetchall())
         for column in cursor.fetchall():
             column_details.append(
                 {
@@ -104,9 +302,11 @@ def get_column_names(conn, table_name, db_type, schema_name=""):
 
 
 def get_foreign_key_constraints(conn, db_type, schema_name=""):
-    """Return a list of foreign key constraints for PostgreSQL."""
+    """Return a list of foreign key constraints for SQLite or PostgreSQL."""
+    if db_type == "sqlite":
+        return _get_sqlite_foreign_keys(conn)
     if db_type != "postgresql":
-        return []  # Only implemented for PostgreSQL
+        return []
 
     cursor = conn.cursor()
     query = """
@@ -157,78 +357,125 @@ def get_foreign_key_constraints(conn, db_type, schema_name=""):
         return []
 
 
-def get_database_schema(conn, db_type, schema=""):
+def _get_sqlite_foreign_keys(conn):
+    """Return foreign keys for every SQLite table in a single pragma join."""
+    cursor = conn.execute(
+        """
+        SELECT m.name, f.id, f."from", f."table", f."to"
+        FROM sqlite_master AS m
+        JOIN pragma_foreign_key_list(m.name) AS f
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+        ORDER BY m.name, f.id, f.seq;
+        """
+    )
+    return [
+        {
+            # SQLite foreign keys are unnamed, so synthesise a stable name
+            "constraint_name": f"{row[0]}_fk_{row[1]}",
+            "table_name": row[0],
+            "column_name": row[2],
+            "foreign_table_name": row[3],
+            "foreign_column_name": row[4],
+        }
+        for row in cursor.fetchall()
+    ]
+
+
+def get_schema_catalog(conn, db_type, schema_name=""):
     """
-    Return a detailed representation of the database schema including foreign key relationships.
+    Return every table, column and foreign key of a schema using bulk catalog queries.
 
-    For PostgreSQL databases, this function now includes:
-    - Table and column information
-    - Foreign key constraints for each table
-    - A summary of all foreign key relationships
-
-    Args:
-        conn: Database connection object
-        db_type: Database type ('sqlite' or 'postgresql')
-        schema: Schema name (required for PostgreSQL)
+    PostgreSQL reads ``pg_catalog`` once for columns and once for foreign keys;
+    SQLite joins ``sqlite_master`` with ``pragma_table_info`` and
+    ``pragma_foreign_key_list``. Column dictionaries use the same keys as
+    ``get_column_names``.
 
     Returns:
-        str: Formatted schema information including FK relationships
+        dict: {"tables": {table_name: [column, ...]}, "foreign_keys": [fk, ...]}
     """
-    schema_lines = []
-    table_names = get_table_names(conn, db_type, schema)
+    tables = {}
 
-    # Get foreign key constraints for the entire schema (PostgreSQL only)
-    fk_constraints = get_foreign_key_constraints(conn, db_type, schema)
-
-    # Group foreign keys by table for easier lookup
-    fk_by_table = {}
-    for fk in fk_constraints:
-        table_name = fk["table_name"]
-        if table_name not in fk_by_table:
-            fk_by_table[table_name] = []
-        fk_by_table[table_name].append(fk)
-
-    for table_name in table_names:
-        columns = get_column_names(conn, table_name, db_type, schema)
-        column_info = []
-
-        for col in columns:
-            if db_type == "postgresql":
-                column_desc = (
-                    f"{col['column_name']} {col['data_type']} "
-                    f"(Nullable: {col['is_nullable']}, Max Length: {col['max_length']})"
+    if db_type == "sqlite":
+        cursor = conn.execute(
+            """
+            SELECT m.name, p.name, p.type, p."notnull", p.dflt_value
+            FROM sqlite_master AS m
+            LEFT JOIN pragma_table_info(m.name) AS p
+            WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+            ORDER BY m.name, p.cid;
+            """
+        )
+        for table_name, column_name, data_type, not_null, default_value in cursor.fetchall():
+            columns = tables.setdefault(table_name, [])
+            if column_name is not None:
+                columns.append(
+                    {
+                        "column_name": column_name,
+                        "data_type": data_type,
+                        "not_null": bool(not_null),
+                        "default_value": default_value,
+                    }
                 )
-            else:
-                # SQLite format
-                column_desc = (
-                    f"{col['column_name']} {col['data_type']} "
-                    f"(Not Null: {col['not_null']}, Default: {col['default_value']})"
+
+    elif db_type == "postgresql":
+        cursor = conn.cursor()
+        # Mirrors information_schema.columns output (data_type, character_maximum_length,
+        # is_nullable) without its per-row privilege checks and view overhead.
+        cursor.execute(
+            """
+            SELECT c.relname,
+                   a.attname,
+                   format_type(a.atttypid, NULL),
+                   CASE WHEN a.atttypid IN ('bpchar'::regtype, 'varchar'::regtype)
+                             AND a.atttypmod > 0
+                        THEN a.atttypmod - 4 END,
+                   CASE WHEN a.attnotnull THEN 'NO' ELSE 'YES' END
+            FROM pg_catalog.pg_class AS c
+            JOIN pg_catalog.pg_namespace AS n ON n.oid = c.relnamespace
+            LEFT JOIN pg_catalog.pg_attribute AS a
+                   ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+            WHERE n.nspname = %s AND c.relkind IN ('r', 'p')
+            ORDER BY c.relname, a.attnum;
+            """,
+            (schema_name,),
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        for table_name, column_name, data_type, max_length, is_nullable in rows:
+            columns = tables.setdefault(table_name, [])
+            if column_name is not None:
+                columns.append(
+                    {
+                        "column_name": column_name,
+                        "data_type": data_type,
+                        "max_length": max_length,
+                        "is_nullable": is_nullable,
+                    }
                 )
-            column_info.append(column_desc)
 
-        if schema:
-            header = f"Schema: {schema}\nTable: {table_name}\nColumns:\n  "
-        else:
-            header = f"Table: {table_name}\nColumns:\n  "
+    return {
+        "tables": tables,
+        "foreign_keys": get_foreign_key_constraints(conn, db_type, schema_name),
+    }
 
-        table_info = header + "\n  ".join(column_info)
 
-        # Add foreign key information if available
-        if table_name in fk_by_table:
-            fk_info = []
-            for fk in fk_by_table[table_name]:
-                fk_desc = (
-                    f"{fk['column_name']} -> {fk['foreign_table_name']}.{fk['foreign_column_name']} "
-                    f"(Constraint: {fk['constraint_name']})"
-                )
-                fk_info.append(fk_desc)
+def render_database_schema(catalog, db_type, schema=""):
+    """Format a catalog from ``get_schema_catalog`` as the schema string given to the assistant."""
+    schema_lines = []
+    fk_constraints = catalog["foreign_keys"]
 
-            table_info += "\nForeign Keys:\n  " + "\n  ".join(fk_info)
+    # Group foreign keys by table for easier lookup
+    fk_by_table = {}
+    for fk in fk_constraints:
+        fk_by_table.setdefault(fk["table_name"], []).append(fk)
 
-        schema_lines.append(table_info)
+    for table_name, columns in catalog["tables"].items():
+        schema_lines.append(
+            render_table_schema(table_name, columns, fk_by_table.get(table_name, []), db_type, schema)
+        )
 
     # Add a summary of all foreign key relationships at the end
-    if fk_constraints and db_type == "postgresql":
+    if fk_constraints:
         fk_summary = ["\n=== Foreign Key Relationships Summary ==="]
         for fk in fk_constraints:
             fk_summary.append(
@@ -240,6 +487,67 @@ def get_database_schema(conn, db_type, schema=""):
     return "\n\n".join(schema_lines)
 
 
+def render_table_schema(table_name, columns, foreign_keys, db_type, schema=""):
+    """Format a single table's columns and foreign keys."""
+    column_info = []
+    for col in columns:
+        if db_type == "postgresql":
+            column_desc = (
+                f"{col['column_name']} {col['data_type']} "
+                f"(Nullable: {col['is_nullable']}, Max Length: {col['max_length']})"
+            )
+        else:
+            # SQLite format
+            column_desc = (
+                f"{col['column_name']} {col['data_type']} "
+                f"(Not Null: {col['not_null']}, Default: {col['default_value']})"
+            )
+        column_info.append(column_desc)
+
+    if schema:
+        header = f"Schema: {schema}\nTable: {table_name}\nColumns:\n  "
+    else:
+        header = f"Table: {table_name}\nColumns:\n  "
+
+    table_info = header + "\n  ".join(column_info)
+
+    # Add foreign key information if available
+    if foreign_keys:
+        fk_info = []
+        for fk in foreign_keys:
+            fk_desc = (
+                f"{fk['column_name']} -> {fk['foreign_table_name']}.{fk['foreign_column_name']} "
+                f"(Constraint: {fk['constraint_name']})"
+            )
+            fk_info.append(fk_desc)
+
+        table_info += "\nForeign Keys:\n  " + "\n  ".join(fk_info)
+
+    return table_info
+
+
+def get_database_schema(conn, db_type, schema=""):
+    """
+    Return a detailed representation of the database schema including foreign key relationships.
+
+    The schema is read in bulk with ``get_schema_catalog`` (one or two catalog
+    queries regardless of table count) and includes:
+    - Table and column information
+    - Foreign key constraints for each table
+    - A summary of all foreign key relationships
+
+    Args:
+        conn: Database connection object
+        db_type: Database type ('sqlite' or 'postgresql')
+        schema: Schema name (required for PostgreSQL)
+
+    Returns:
+        str: Formatted schema information including FK relationships
+    """
+    catalog = get_schema_catalog(conn, db_type, schema)
+    return render_database_schema(catalog, db_type, schema)
+
+
 def execute_query(conn, query):
     """Execute an SQL query and return the results."""
     try:
@@ -255,41 +563,150 @@ def execute_query(conn, query):
         return str(e), None
 
 
-def ask_database(conn, query, db_type):
-    """Function to query database with a provided SQL query."""
+class QueryResult:
+    """
+    Columnar result of ``ask_database``: one list of values per column.
+
+    ``truncated`` is set when the row or byte cap stopped the fetch early, and
+    ``truncation_reason`` says which one.
+    """
+
+    def __init__(self, column_names):
+        self.column_names = list(column_names)
+        self.columns = [[] for _ in self.column_names]
+        self.row_count = 0
+        # Estimated size of the result rendered as a github-format table
+        self.byte_count = 0
+        # tabulate pads each header by two characters
+        self.column_widths = [len(str(name)) + 2 for name in self.column_names]
+        self.multibyte_bytes = 0
+        self.truncated = False
+        self.truncation_reason = None
+
+    def append(self, row):
+        for values, value in zip(self.columns, row):
+            values.append(value)
+        self.row_count += 1
+
+    def rows(self):
+        """Iterate over the result row by row."""
+        return zip(*self.columns)
+
+    def truncation_note(self):
+        if not self.truncated:
+            return ""
+        return f"(Result truncated after {self.row_count} rows: {self.truncation_reason}.)"
+
+
+def _stream_rows(cursor, result, max_rows, max_bytes, batch_size):
+    """Fetch rows in batches into ``result`` until the cursor or a cap is exhausted."""
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        for row in batch:
+            if result.row_count >= max_rows:
+                result.truncated = True
+                result.truncation_reason = f"row limit of {max_rows} reached"
+                return
+            # Every line of the rendered table is padded to the widest value in
+            # each column, plus "| " / " | " / " |" separators and a newline; the
+            # header and its rule line are two more such lines. Non-ASCII text
+            # takes more bytes than the characters it is padded by.
+            texts = [str(value) for value in row]
+            widths = [max(width, len(text)) for width, text in zip(result.column_widths, texts)]
+            multibyte = result.multibyte_bytes + sum(
+                len(text.encode()) - len(text) for text in texts
+            )
+            line_bytes = sum(widths) + 3 * len(widths) + 2
+            rendered_bytes = (result.row_count + 3) * line_bytes + multibyte
+            if rendered_bytes > max_bytes:
+                result.truncated = True
+                result.truncation_reason = f"size limit of {max_bytes} bytes reached"
+                return
+            result.column_widths = widths
+            result.multibyte_bytes = multibyte
+            result.byte_count = rendered_bytes
+            result.append(row)
+
+
+def ask_database(
+    conn,
+    query,
+    db_type,
+    max_rows=DB_RESULT_MAX_ROWS,
+    max_bytes=DB_RESULT_MAX_BYTES,
+    batch_size=DB_FETCH_BATCH_SIZE,
+):
+    """
+    Function to query database with a provided SQL query.
+
+    Rows are streamed in batches (a server-side named cursor on PostgreSQL,
+    ``fetchmany`` on SQLite) and stop at ``max_rows`` rows or ``max_bytes`` of
+    rendered text, so an unbounded SELECT cannot exhaust memory. Statements
+    running past ``DB_STATEMENT_TIMEOUT_SECONDS`` are aborted by the database.
+
+    Returns:
+        QueryResult, or an error message string
+    """
     # Allow only SELECT queries
     if not query.strip().upper().startswith("SELECT"):
         return "Only SELECT queries are allowed."
 
     try:
         if db_type == "sqlite":
-            cursor = conn.execute(query)
-            results = cursor.fetchall()
-            column_names = (
-                [description[0] for description in cursor.description]
-                if cursor.description
-                else []
-            )
+            # SQLite has no statement_timeout; abort from the progress handler instead
+            deadline = time.monotonic() + DB_STATEMENT_TIMEOUT_SECONDS
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+            try:
+                cursor = conn.execute(query)
+                column_names = (
+                    [description[0] for description in cursor.description]
+                    if cursor.description
+                    else []
+                )
+                result = QueryResult(column_names)
+                _stream_rows(cursor, result, max_rows, max_bytes, batch_size)
+                cursor.close()
+            finally:
+                conn.set_progress_handler(None, 0)
         elif db_type == "postgresql":
-            cursor = conn.cursor()
+            # Named cursors keep the result set on the server and ship it in batches
+            cursor = conn.cursor(name=f"ask_database_{uuid.uuid4().hex}")
+            cursor.itersize = batch_size
             cursor.execute(query)
-            results = cursor.fetchall()
-            column_names = [desc.name for desc in cursor.description]
+            first_batch = cursor.fetchmany(batch_size)
+            result = QueryResult([desc.name for desc in cursor.description or []])
+            _stream_rows(
+                _PrefetchedCursor(first_batch, cursor), result, max_rows, max_bytes, batch_size
+            )
             cursor.close()
         else:
             return "Unsupported database type."
 
-        # Format results as a list of dictionaries
-        result_dicts = [dict(zip(column_names, row)) for row in results]
-        return result_dicts
+        return result
     except Exception as e:
         return str(e)
 
 
+class _PrefetchedCursor:
+    """Replays an already-fetched first batch before delegating to the cursor."""
+
+    def __init__(self, first_batch, cursor):
+        self._first_batch = first_batch
+        self._cursor = cursor
+
+    def fetchmany(self, size):
+        if self._first_batch is not None:
+            batch, self._first_batch = self._first_batch, None
+            return batch
+        return self._cursor.fetchmany(size)
+
+
 def get_foreign_key_relationships(conn, db_type, schema_name=""):
     """Return a formatted string of foreign key relationships for easy reading by AI assistants."""
-    if db_type != "postgresql":
-        return "Foreign key relationships are only supported for PostgreSQL databases."
+    if db_type not in ("postgresql", "sqlite"):
+        return "Foreign key relationships are only supported for PostgreSQL and SQLite databases."
 
     fk_constraints = get_foreign_key_constraints(conn, db_type, schema_name)
 